@@ -100,9 +100,10 @@ boto3==1.34.0
 botocore==1.34.0
 pyjwt==2.8.0
 cryptography==41.0.7
-requests==2.31.0
+urllib3==2.0.7
+certifi==2023.11.17
+orjson==3.9.10
 python-dateutil==2.8.2
-validators==0.22.0
 pydantic==2.5.0
 fastapi==0.104.1
 mangum==0.17.0
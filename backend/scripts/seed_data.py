@@ -11,10 +11,10 @@ from datetime import datetime, timezone, timedelta
 import os
 import sys
 
-# Add utils to path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src', 'utils'))
+# Add src to path so the shared utils import as the utils package
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from database import DatabaseManager
+from utils.database import DatabaseManager
 
 class DataSeeder:
     """Seeds test data into DynamoDB tables."""
@@ -162,9 +162,6 @@ class DataSeeder:
                     'phone': '07987654321'
                 },
                 'medical_info': {
-                    'allergies_legacy': ['Penicillin'],
-                    'conditions_legacy': ['Asthma'],
-                    'medications_legacy': ['Salbutamol inhaler'],
                     'allergies': [
                         {
                             'display_text': 'Penicillin allergy',
@@ -218,9 +215,6 @@ class DataSeeder:
                     'phone': '07876543210'
                 },
                 'medical_info': {
-                    'allergies_legacy': [],
-                    'conditions_legacy': ['Diabetes Type 2', 'Hypertension'],
-                    'medications_legacy': ['Metformin 500mg', 'Lisinopril 10mg'],
                     'allergies': [],
                     'conditions': [
                         {
@@ -280,9 +274,6 @@ class DataSeeder:
                     'phone': '07765432109'
                 },
                 'medical_info': {
-                    'allergies_legacy': ['Nuts', 'Shellfish'],
-                    'conditions_legacy': [],
-                    'medications_legacy': [],
                     'allergies': [
                         {
                             'display_text': 'Tree nuts allergy',
@@ -327,9 +318,6 @@ class DataSeeder:
                     'phone': '07654321098'
                 },
                 'medical_info': {
-                    'allergies_legacy': ['Aspirin'],
-                    'conditions_legacy': ['Arthritis', 'High Cholesterol'],
-                    'medications_legacy': ['Ibuprofen 400mg', 'Atorvastatin 20mg'],
                     'allergies': [
                         {
                             'display_text': 'Aspirin allergy',
@@ -68,7 +68,8 @@ class LocalSetup:
                 ],
                 'attribute_definitions': [
                     {'AttributeName': 'patient_id', 'AttributeType': 'S'},
-                    {'AttributeName': 'nhs_number', 'AttributeType': 'S'}
+                    {'AttributeName': 'nhs_number', 'AttributeType': 'S'},
+                    {'AttributeName': 'email', 'AttributeType': 'S'}
                 ],
                 'global_secondary_indexes': [
                     {
@@ -78,6 +79,14 @@ class LocalSetup:
                         ],
                         'Projection': {'ProjectionType': 'ALL'},
                         'ProvisionedThroughput': {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+                    },
+                    {
+                        'IndexName': 'EmailIndex',
+                        'KeySchema': [
+                            {'AttributeName': 'email', 'KeyType': 'HASH'}
+                        ],
+                        'Projection': {'ProjectionType': 'ALL'},
+                        'ProvisionedThroughput': {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
                     }
                 ]
             },
@@ -144,27 +153,32 @@ class LocalSetup:
         os.environ['AWS_REGION'] = 'us-east-1'
         
         # Import and use the existing seeder
-        sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src', 'utils'))
+        sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
         
         try:
-            from database import DatabaseManager
+            from utils.database import DatabaseManager
             
             # Override the database manager to use local endpoint
             class LocalDatabaseManager(DatabaseManager):
                 def __init__(self):
-                    self.dynamodb = boto3.resource(
+                    super().__init__()
+                    self.table_names = {
+                        'appointments': 'local-appointments',
+                        'patients': 'local-patients',
+                        'practices': 'local-practices'
+                    }
+                
+                def _create_dynamodb(self):
+                    return boto3.session.Session().resource(
                         'dynamodb',
                         endpoint_url='http://localhost:8000',
                         region_name='us-east-1',
                         aws_access_key_id='local',
                         aws_secret_access_key='local'
                     )
-                    self.appointments_table = self.dynamodb.Table('local-appointments')
-                    self.patients_table = self.dynamodb.Table('local-patients')
-                    self.practices_table = self.dynamodb.Table('local-practices')
             
             # Replace the global db instance
-            import database
+            import utils.database as database
             database.db = LocalDatabaseManager()
             
             # Import and run the seeder
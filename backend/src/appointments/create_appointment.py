@@ -10,13 +10,9 @@ from datetime import datetime, timezone
 from typing import Dict, Any
 
 # Import utilities
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from database import db
+from utils.database import db
 from utils.auth import require_auth
-from responses import (
+from utils.responses import (
     created_response, bad_request_response, conflict_response,
     internal_error_response, handle_lambda_error
 )
@@ -54,8 +50,8 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         
         # Validate input data
         validation_result = validate_appointment_data(body)
-        if not validation_result['valid']:
-            return bad_request_response("Validation failed", validation_result['errors'])
+        if not validation_result.valid:
+            return bad_request_response("Validation failed", validation_result.errors)
         
         # Extract appointment data
         appointment_data = {
@@ -90,19 +86,19 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
             return conflict_response("Time slot is already booked")
         
         # Verify patient exists
-        patient = db.get_item('patients', {'patient_id': appointment_data['patient_id']})
+        patient = db.get_item('patients', {'patient_id': appointment_data['patient_id']}, projection=['patient_id'])
         if not patient:
             return bad_request_response("Patient not found")
         
         # Verify practice exists
-        practice = db.get_item('practices', {'practice_id': appointment_data['practice_id']})
+        practice = db.get_item('practices', {'practice_id': appointment_data['practice_id']}, projection=['practice_id'])
         if not practice:
             return bad_request_response("Practice not found")
         
         # Create the appointment
         created_appointment = db.create_item('appointments', appointment_data)
         
-        logger.info(f"Appointment created: {created_appointment['appointment_id']}")
+        logger.info("Appointment created: %s", created_appointment['appointment_id'])
         
         return created_response(
             created_appointment,
@@ -112,7 +108,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     except json.JSONDecodeError:
         return bad_request_response("Invalid JSON in request body")
     except Exception as e:
-        logger.error(f"Error creating appointment: {str(e)}")
+        logger.error("Error creating appointment: %s", e)
         return internal_error_response("Failed to create appointment")
 
 def check_appointment_conflicts(
@@ -171,5 +167,5 @@ def check_appointment_conflicts(
         return conflicts
         
     except Exception as e:
-        logger.error(f"Error checking appointment conflicts: {str(e)}")
+        logger.error("Error checking appointment conflicts: %s", e)
         return []  # Assume no conflicts on error to allow booking
\ No newline at end of file
@@ -9,13 +9,9 @@ from datetime import datetime, timezone
 from typing import Dict, Any
 
 # Import utilities
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from database import db
+from utils.database import db
 from utils.auth import require_auth
-from responses import (
+from utils.responses import (
     success_response, bad_request_response, not_found_response,
     forbidden_response, internal_error_response, handle_lambda_error
 )
@@ -100,7 +96,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
             # Permanently delete the appointment (admin only)
             db.delete_item('appointments', {'appointment_id': appointment_id})
             
-            logger.info(f"Appointment permanently deleted: {appointment_id} by {user_id}")
+            logger.info("Appointment permanently deleted: %s by %s", appointment_id, user_id)
             
             return success_response(
                 {'appointment_id': appointment_id},
@@ -119,7 +115,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
                 }
             )
             
-            logger.info(f"Appointment cancelled: {appointment_id} by {user_id}")
+            logger.info("Appointment cancelled: %s by %s", appointment_id, user_id)
             
             return success_response(
                 updated_appointment,
@@ -127,5 +123,5 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
             )
         
     except Exception as e:
-        logger.error(f"Error deleting appointment: {str(e)}")
+        logger.error("Error deleting appointment: %s", e)
         return internal_error_response("Failed to cancel appointment")
@@ -9,13 +9,9 @@ from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List
 
 # Import utilities
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from database import db
+from utils.database import db
 from utils.auth import require_auth
-from responses import (
+from utils.responses import (
     success_response, bad_request_response, forbidden_response,
     internal_error_response, handle_lambda_error
 )
@@ -93,7 +89,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         # Enrich appointments with patient/practice details
         enriched_appointments = enrich_appointments(appointments)
         
-        logger.info(f"Retrieved {len(enriched_appointments)} appointments for user {user_id}")
+        logger.info("Retrieved %s appointments for user %s", len(enriched_appointments), user_id)
         
         return success_response({
             'appointments': enriched_appointments,
@@ -110,7 +106,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     except ValueError as e:
         return bad_request_response(str(e))
     except Exception as e:
-        logger.error(f"Error retrieving appointments: {str(e)}")
+        logger.error("Error retrieving appointments: %s", e)
         return internal_error_response("Failed to retrieve appointments")
 
 def get_appointments_by_patient(
@@ -152,7 +148,7 @@ def get_appointments_by_patient(
         return appointments
         
     except Exception as e:
-        logger.error(f"Error getting appointments by patient: {str(e)}")
+        logger.error("Error getting appointments by patient: %s", e)
         return []
 
 def get_appointments_by_practice(
@@ -194,7 +190,7 @@ def get_appointments_by_practice(
         return appointments
         
     except Exception as e:
-        logger.error(f"Error getting appointments by practice: {str(e)}")
+        logger.error("Error getting appointments by practice: %s", e)
         return []
 
 def enrich_appointments(appointments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -205,10 +201,16 @@ def enrich_appointments(appointments: List[Dict[str, Any]]) -> List[Dict[str, An
     for appointment in appointments:
         try:
             # Get patient details
-            patient = db.get_item('patients', {'patient_id': appointment['patient_id']})
+            patient = db.get_item(
+                'patients', {'patient_id': appointment['patient_id']},
+                projection=['first_name', 'last_name', 'nhs_number', 'date_of_birth']
+            )
             
             # Get practice details
-            practice = db.get_item('practices', {'practice_id': appointment['practice_id']})
+            practice = db.get_item(
+                'practices', {'practice_id': appointment['practice_id']},
+                projection=['name', 'address', 'phone']
+            )
             
             # Create enriched appointment
             enriched_appointment = appointment.copy()
@@ -231,7 +233,7 @@ def enrich_appointments(appointments: List[Dict[str, Any]]) -> List[Dict[str, An
             enriched.append(enriched_appointment)
             
         except Exception as e:
-            logger.error(f"Error enriching appointment {appointment.get('appointment_id')}: {str(e)}")
+            logger.error("Error enriching appointment %s: %s", appointment.get('appointment_id'), e)
             # Include appointment without enrichment
             enriched.append(appointment)
     
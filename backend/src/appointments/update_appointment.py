@@ -9,13 +9,9 @@ from datetime import datetime, timezone
 from typing import Dict, Any
 
 # Import utilities
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from database import db
+from utils.database import db
 from utils.auth import require_auth
-from responses import (
+from utils.responses import (
     success_response, bad_request_response, not_found_response,
     forbidden_response, conflict_response, internal_error_response, handle_lambda_error
 )
@@ -98,8 +94,8 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         # Validate appointment datetime if being updated
         if 'appointment_datetime' in update_data:
             time_validation = validate_appointment_time(update_data['appointment_datetime'])
-            if not time_validation['valid']:
-                errors['appointment_datetime'] = time_validation['errors']
+            if not time_validation.valid:
+                errors['appointment_datetime'] = time_validation.errors
         
         # Validate appointment type
         if 'appointment_type' in update_data:
@@ -156,7 +152,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
             expression_values
         )
         
-        logger.info(f"Appointment updated: {appointment_id}")
+        logger.info("Appointment updated: %s", appointment_id)
         
         return success_response(
             updated_appointment,
@@ -166,7 +162,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     except json.JSONDecodeError:
         return bad_request_response("Invalid JSON in request body")
     except Exception as e:
-        logger.error(f"Error updating appointment: {str(e)}")
+        logger.error("Error updating appointment: %s", e)
         return internal_error_response("Failed to update appointment")
 
 def check_appointment_conflicts(
@@ -230,5 +226,5 @@ def check_appointment_conflicts(
         return conflicts
         
     except Exception as e:
-        logger.error(f"Error checking appointment conflicts: {str(e)}")
+        logger.error("Error checking appointment conflicts: %s", e)
         return []  # Assume no conflicts on error
@@ -5,15 +5,12 @@ Handles login, registration, and token management with AWS Cognito.
 
 import json
 import logging
+import os
 from typing import Dict, Any
 
 # Import utilities
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from database import db
-from responses import (
+from utils.database import db, uniqueness_sentinel
+from utils.responses import (
     success_response, created_response, bad_request_response,
     unauthorized_response, internal_error_response, handle_lambda_error
 )
@@ -21,6 +18,7 @@ from utils.validators import validate_email, validate_nhs_number
 import uuid
 from datetime import datetime, timezone
 import jwt
+from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -44,7 +42,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
             return bad_request_response("Invalid endpoint or method")
             
     except Exception as e:
-        logger.error(f"Error in auth handler: {str(e)}")
+        logger.error("Error in auth handler: %s", e)
         return internal_error_response("Authentication service error")
 
 def handle_login(event: Dict[str, Any]) -> Dict[str, Any]:
@@ -110,11 +108,11 @@ def handle_login(event: Dict[str, Any]) -> Dict[str, Any]:
                     }
                 }
                 
-                logger.info(f"User logged in successfully: {email}")
+                logger.info("User logged in successfully: %s", email)
                 return success_response(response_data, "Login successful")
                 
             except Exception as e:
-                logger.error(f"Authentication failed for {email}: {str(e)}")
+                logger.error("Authentication failed for %s: %s", email, e)
                 return unauthorized_response("Invalid email or password")
         
         # AWS: use Cognito (TODO: implement when deploying)
@@ -124,7 +122,7 @@ def handle_login(event: Dict[str, Any]) -> Dict[str, Any]:
     except json.JSONDecodeError:
         return bad_request_response("Invalid JSON in request body")
     except Exception as e:
-        logger.error(f"Error in login handler: {str(e)}")
+        logger.error("Error in login handler: %s", e)
         return internal_error_response("Login failed")
 
 def handle_register(event: Dict[str, Any]) -> Dict[str, Any]:
@@ -212,9 +210,6 @@ def handle_register(event: Dict[str, Any]) -> Dict[str, Any]:
                     'address': body_data.get('address', {}),
                     'emergency_contact': body_data.get('emergency_contact', {}),
                     'medical_info': {
-                        'allergies_legacy': [],
-                        'conditions_legacy': [],
-                        'medications_legacy': [],
                         'allergies': [],
                         'conditions': [],
                         'medications': [],
@@ -227,9 +222,29 @@ def handle_register(event: Dict[str, Any]) -> Dict[str, Any]:
                     'status': 'active'
                 }
                 
-                db.create_item('patients', new_patient)
+                # Reserve the email (and NHS number) with the account so concurrent
+                # registrations can't both get past the lookup above
+                now_iso = new_patient['created_at']
+                operations = [
+                    {'table': 'patients', 'item': new_patient, 'condition': 'attribute_not_exists(patient_id)'},
+                    uniqueness_sentinel(f"EMAIL#{email}", patient_id, now_iso)
+                ]
+                conflict_messages = ["Registration failed", "User with this email already exists"]
+                if nhs_number:
+                    operations.append(uniqueness_sentinel(f"NHS#{nhs_number}", patient_id, now_iso))
+                    conflict_messages.append("User with this NHS number already exists")
+                
+                try:
+                    db.transact_write_items(operations)
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'TransactionCanceledException':
+                        raise
+                    for reason, message in zip(e.response.get('CancellationReasons', []), conflict_messages):
+                        if reason.get('Code') == 'ConditionalCheckFailed':
+                            return bad_request_response(message)
+                    raise
                 
-                logger.info(f"User registered successfully: {email}")
+                logger.info("User registered successfully: %s", email)
                 return created_response({
                     'user_id': patient_id,
                     'email': email,
@@ -238,7 +253,7 @@ def handle_register(event: Dict[str, Any]) -> Dict[str, Any]:
                 }, "User registered successfully")
                 
             except Exception as e:
-                logger.error(f"Registration failed for {email}: {str(e)}")
+                logger.error("Registration failed for %s: %s", email, e)
                 return internal_error_response("Registration failed")
         
         # AWS: use Cognito (TODO: implement when deploying)
@@ -248,5 +263,5 @@ def handle_register(event: Dict[str, Any]) -> Dict[str, Any]:
     except json.JSONDecodeError:
         return bad_request_response("Invalid JSON in request body")
     except Exception as e:
-        logger.error(f"Error in registration handler: {str(e)}")
+        logger.error("Error in registration handler: %s", e)
         return internal_error_response("Registration failed")
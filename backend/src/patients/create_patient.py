@@ -3,20 +3,19 @@ AWS Lambda function for creating patient records.
 Handles patient registration with NHS number validation and data integrity.
 """
 
-import json
 import logging
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import Dict, Any
+from botocore.exceptions import ClientError
 
 # Import utilities
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from database import db
+from utils.database import db, uniqueness_sentinel
 from utils.auth import require_auth
-from responses import (
+from utils.medical import MEDICAL_FIELDS
+from utils.request import RequestBodyError, parse_json_body
+from utils.responses import (
     created_response, bad_request_response, conflict_response,
     internal_error_response, handle_lambda_error
 )
@@ -25,106 +24,35 @@ from utils.validators import validate_patient_data
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-def process_medical_info(medical_data: Dict[str, Any]) -> Dict[str, Any]:
+# Reused across warm invocations so the pre-write lookups can overlap
+_lookup_executor = ThreadPoolExecutor(max_workers=3)
+
+def process_medical_info(medical_data: Dict[str, Any], now_iso: str = None) -> Dict[str, Any]:
     """
-    Process medical information to support dual storage format.
-    Handles both legacy string arrays and new coded medical data.
+    Process medical information into coded storage format.
+    Plain strings, and the older *_legacy string lists, are lifted into coded items.
     """
-    from datetime import datetime, timezone
-    
     processed = {
-        'allergies_legacy': [],
-        'conditions_legacy': [],
-        'medications_legacy': [],
         'allergies': [],
         'conditions': [],
         'medications': [],
         'notes': medical_data.get('notes', ''),
-        'last_updated': datetime.now(timezone.utc).isoformat(),
+        'last_updated': now_iso or datetime.now(timezone.utc).isoformat(),
         'data_source': 'user_entered'
     }
     
-    # Handle legacy string format (backward compatibility)
-    if 'allergies' in medical_data and isinstance(medical_data['allergies'], list):
-        if medical_data['allergies'] and isinstance(medical_data['allergies'][0], str):
-            # Legacy string format
-            processed['allergies_legacy'] = medical_data['allergies']
-            # Auto-convert to coded format with basic structure
-            processed['allergies'] = [
-                {
-                    'display_text': allergy,
-                    'code': None,
-                    'system': None,
-                    'verified': False,
-                    'severity': None,
-                    'reaction': [],
-                    'onset_date': None
-                }
-                for allergy in medical_data['allergies']
-            ]
-        else:
-            # New coded format
-            processed['allergies'] = medical_data['allergies']
-            # Extract display text for legacy compatibility
-            processed['allergies_legacy'] = [
-                item.get('display_text', '') for item in medical_data['allergies']
+    for field, template in MEDICAL_FIELDS:
+        items = medical_data.get(field)
+        # Legacy lists only stand in when no coded list was sent
+        if not items:
+            items = medical_data.get(f'{field}_legacy')
+        # Exact type checks: parsed JSON only ever yields plain lists and strs
+        if type(items) is list and items:
+            processed[field] = [
+                {**template, 'display_text': item} if type(item) is str else item
+                for item in items
             ]
     
-    # Handle conditions (same logic)
-    if 'conditions' in medical_data and isinstance(medical_data['conditions'], list):
-        if medical_data['conditions'] and isinstance(medical_data['conditions'][0], str):
-            processed['conditions_legacy'] = medical_data['conditions']
-            processed['conditions'] = [
-                {
-                    'display_text': condition,
-                    'code': None,
-                    'system': None,
-                    'verified': False,
-                    'clinical_status': 'active',
-                    'onset_date': None,
-                    'resolved_date': None
-                }
-                for condition in medical_data['conditions']
-            ]
-        else:
-            processed['conditions'] = medical_data['conditions']
-            processed['conditions_legacy'] = [
-                item.get('display_text', '') for item in medical_data['conditions']
-            ]
-    
-    # Handle medications (same logic)
-    if 'medications' in medical_data and isinstance(medical_data['medications'], list):
-        if medical_data['medications'] and isinstance(medical_data['medications'][0], str):
-            processed['medications_legacy'] = medical_data['medications']
-            processed['medications'] = [
-                {
-                    'display_text': medication,
-                    'code': None,
-                    'system': None,
-                    'verified': False,
-                    'dosage': None,
-                    'frequency': None,
-                    'route': None,
-                    'start_date': None,
-                    'end_date': None,
-                    'prescriber': None
-                }
-                for medication in medical_data['medications']
-            ]
-        else:
-            processed['medications'] = medical_data['medications']
-            processed['medications_legacy'] = [
-                item.get('display_text', '') for item in medical_data['medications']
-            ]
-    
-    # Handle explicit legacy fields if provided
-    if 'allergies_legacy' in medical_data:
-        processed['allergies_legacy'] = medical_data['allergies_legacy']
-    if 'conditions_legacy' in medical_data:
-        processed['conditions_legacy'] = medical_data['conditions_legacy']
-    if 'medications_legacy' in medical_data:
-        processed['medications_legacy'] = medical_data['medications_legacy']
-    
     return processed
 
 @handle_lambda_error
@@ -154,9 +82,6 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
             "phone": "07987654321"
         },
         "medical_info": {
-            "allergies_legacy": ["Penicillin"],
-            "conditions_legacy": ["Diabetes Type 2"],
-            "medications_legacy": ["Metformin 500mg"],
             "allergies": [
                 {
                     "display_text": "Penicillin allergy",
@@ -186,17 +111,16 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """
     
     try:
-        # Parse request body
-        if 'body' not in event:
-            return bad_request_response("Request body is required")
+        now_iso = datetime.now(timezone.utc).isoformat()
         
-        body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
+        # Parse request body
+        body = parse_json_body(event)
         user = event.get('user', {})
         
         # Validate input data
         validation_result = validate_patient_data(body)
-        if not validation_result['valid']:
-            return bad_request_response("Validation failed", validation_result['errors'])
+        if not validation_result.valid:
+            return bad_request_response("Validation failed", validation_result.errors)
         
         # Authorization check
         user_role = user.get('role')
@@ -210,65 +134,100 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
             # Staff/admin can create records for others
             patient_id = str(uuid.uuid4())
         
-        # Check if patient with NHS number already exists
-        if body.get('nhs_number'):
-            existing_patient = check_existing_patient_by_nhs(body['nhs_number'])
-            if existing_patient:
-                return conflict_response("Patient with this NHS number already exists")
+        # Normalise submitted strings once
+        first_name = body['first_name'].strip()
+        last_name = body['last_name'].strip()
+        normalized_email = body['email'].lower().strip()
+        phone = body.get('phone', '').strip()
+        nhs_number = body.get('nhs_number', '').strip()
+        date_of_birth = body['date_of_birth']
+        address = body.get('address', {})
+        emergency_contact = body.get('emergency_contact', {})
+        practice_id = body.get('practice_id', '')
+        preferred_gp_id = body.get('preferred_gp_id', '')
         
-        # Check if patient with email already exists
-        existing_patient_email = check_existing_patient_by_email(body['email'])
-        if existing_patient_email:
+        # Start the NHS number, email and practice lookups concurrently
+        nhs_future = None
+        if nhs_number:
+            nhs_future = _lookup_executor.submit(check_existing_patient_by_nhs, nhs_number)
+        email_future = _lookup_executor.submit(check_existing_patient_by_email, normalized_email)
+        practice_future = None
+        if practice_id:
+            practice_future = _lookup_executor.submit(
+                db.get_item, 'practices', {'practice_id': practice_id}, projection=['practice_id']
+            )
+        
+        if nhs_future and nhs_future.result():
+            return conflict_response("Patient with this NHS number already exists")
+        
+        if email_future.result():
             return conflict_response("Patient with this email already exists")
         
+        medical_info = process_medical_info(body.get('medical_info', {}), now_iso=now_iso)
+        
         # Create patient record
         patient_data = {
             'patient_id': patient_id,
-            'first_name': body['first_name'].strip(),
-            'last_name': body['last_name'].strip(),
-            'date_of_birth': body['date_of_birth'],
-            'email': body['email'].lower().strip(),
-            'phone': body.get('phone', '').strip(),
-            'nhs_number': body.get('nhs_number', '').strip(),
-            'address': body.get('address', {}),
-            'emergency_contact': body.get('emergency_contact', {}),
-            'medical_info': process_medical_info(body.get('medical_info', {})),
-            'practice_id': body.get('practice_id', ''),
-            'preferred_gp_id': body.get('preferred_gp_id', ''),
-            'registration_date': datetime.now(timezone.utc).isoformat(),
+            'first_name': first_name,
+            'last_name': last_name,
+            'date_of_birth': date_of_birth,
+            'email': normalized_email,
+            'phone': phone,
+            'nhs_number': nhs_number,
+            'address': address,
+            'emergency_contact': emergency_contact,
+            'medical_info': medical_info,
+            'practice_id': practice_id,
+            'preferred_gp_id': preferred_gp_id,
+            'registration_date': now_iso,
             'status': 'active',
             'created_by': user_id,
-            'created_at': datetime.now(timezone.utc).isoformat(),
-            'updated_at': datetime.now(timezone.utc).isoformat()
+            'created_at': now_iso,
+            'updated_at': now_iso
         }
         
         # Verify practice exists if specified
-        if patient_data['practice_id']:
-            practice = db.get_item('practices', {'practice_id': patient_data['practice_id']})
-            if not practice:
-                return bad_request_response("Practice not found")
+        if practice_future and not practice_future.result():
+            return bad_request_response("Practice not found")
         
-        # Create the patient record
-        created_patient = db.create_item('patients', patient_data)
+        # Create the patient record, reserving the NHS number and email in the same
+        # transaction so concurrent registrations can't both claim them
+        puts = [{'table': 'patients', 'item': patient_data, 'condition': 'attribute_not_exists(patient_id)'}]
+        conflict_messages = ["Patient record already exists"]
+        if patient_data['nhs_number']:
+            puts.append(uniqueness_sentinel(f"NHS#{patient_data['nhs_number']}", patient_id, now_iso))
+            conflict_messages.append("Patient with this NHS number already exists")
+        puts.append(uniqueness_sentinel(f"EMAIL#{patient_data['email']}", patient_id, now_iso))
+        conflict_messages.append("Patient with this email already exists")
         
-        # Remove sensitive information from response
-        response_patient = created_patient.copy()
-        if 'medical_info' in response_patient:
-            # Only include medical info for staff/admin
-            if user_role == 'patient':
-                response_patient.pop('medical_info', None)
+        try:
+            db.transact_write_items(puts)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            for reason, message in zip(e.response.get('CancellationReasons', []), conflict_messages):
+                if reason.get('Code') == 'ConditionalCheckFailed':
+                    return conflict_response(message)
+            raise
+        created_patient = patient_data
         
-        logger.info(f"Patient created: {created_patient['patient_id']}")
+        # Remove sensitive information from response - only include medical info for staff/admin
+        if user_role == 'patient':
+            response_patient = {k: v for k, v in created_patient.items() if k != 'medical_info'}
+        else:
+            response_patient = created_patient
+        
+        logger.info("Patient created: %s", created_patient['patient_id'])
         
         return created_response(
             response_patient,
             "Patient record created successfully"
         )
         
-    except json.JSONDecodeError:
-        return bad_request_response("Invalid JSON in request body")
+    except RequestBodyError as e:
+        return bad_request_response(str(e))
     except Exception as e:
-        logger.error(f"Error creating patient: {str(e)}")
+        logger.error("Error creating patient: %s", e)
         return internal_error_response("Failed to create patient record")
 
 def check_existing_patient_by_nhs(nhs_number: str) -> Dict[str, Any]:
@@ -282,18 +241,20 @@ def check_existing_patient_by_nhs(nhs_number: str) -> Dict[str, Any]:
         )
         return patients[0] if patients else None
     except Exception as e:
-        logger.error(f"Error checking existing patient by NHS number: {str(e)}")
+        logger.error("Error checking existing patient by NHS number: %s", e)
         return None
 
 def check_existing_patient_by_email(email: str) -> Dict[str, Any]:
-    """Check if a patient with the given email already exists."""
+    """Check if a patient with the given (already normalised) email exists."""
     try:
-        patients = db.scan_items(
+        patients = db.query_items(
             'patients',
-            filter_expression='email = :email',
-            expression_values={':email': email.lower().strip()}
+            index_name='EmailIndex',
+            key_condition='email = :email',
+            expression_values={':email': email},
+            limit=1
         )
         return patients[0] if patients else None
     except Exception as e:
-        logger.error(f"Error checking existing patient by email: {str(e)}")
+        logger.error("Error checking existing patient by email: %s", e)
         return None
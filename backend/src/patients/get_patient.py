@@ -3,18 +3,19 @@ AWS Lambda function for retrieving patient records.
 Handles patient data retrieval with proper authorization and privacy controls.
 """
 
+import heapq
 import json
 import logging
-from typing import Dict, Any
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, Optional, Union
 
 # Import utilities
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from database import db
-from utils.auth import require_auth
-from responses import (
+from utils.database import db
+from utils.auth import ELEVATED_ROLES, require_auth
+from utils.medical import MEDICAL_FIELDS
+from utils.responses import (
     success_response, bad_request_response, not_found_response,
     forbidden_response, internal_error_response, handle_lambda_error
 )
@@ -22,6 +23,16 @@ from responses import (
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Optional fields of a recent appointment summary, defaulted to ''
+_APPOINTMENT_SUMMARY_FIELDS = (
+    'appointment_type', 'status', 'reason', 'practice_id', 'practitioner_id'
+)
+
+_MEDICAL_INFO_KEYS = frozenset({
+    'allergies', 'conditions', 'medications',
+    'notes', 'last_updated', 'data_source'
+})
+
 @handle_lambda_error
 @require_auth(allowed_roles=['patient', 'staff', 'admin'])
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
@@ -51,21 +62,25 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         
         user = event.get('user', {})
         
-        # Get patient record
-        patient = db.get_item('patients', {'patient_id': patient_id})
-        if not patient:
-            return not_found_response("Patient not found")
-        
         # Authorization check
         user_role = user.get('role')
         user_id = user.get('user_id')
         user_practice_id = user.get('practice_id')
+        is_elevated = user_role in ELEVATED_ROLES
+        
+        # Get patient record, leaving out medical_info unless it'll be returned
+        projection = None
+        if not (include_medical and is_elevated):
+            projection = _NON_MEDICAL_ATTRIBUTES
+        patient = db.get_item('patients', {'patient_id': patient_id}, projection=projection)
+        if not patient:
+            return not_found_response("Patient not found")
         
         if user_role == 'patient':
             # Patients can only view their own records
             if patient_id != user_id:
                 return forbidden_response("Patients can only view their own records")
-        elif user_role in ['staff', 'admin']:
+        elif is_elevated:
             # Staff can only view patients from their practice
             if patient.get('practice_id') != user_practice_id:
                 return forbidden_response("Staff can only view patients from their practice")
@@ -78,16 +93,45 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
             include_appointments
         )
         
-        logger.info(f"Patient data retrieved: {patient_id} by {user_id}")
+        logger.info("Patient data retrieved: %s by %s", patient_id, user_id)
         
         return success_response(response_data)
         
     except Exception as e:
-        logger.error(f"Error retrieving patient: {str(e)}")
+        logger.error("Error retrieving patient: %s", e)
         return internal_error_response("Failed to retrieve patient record")
 
+@dataclass(slots=True)
+class PatientRecord:
+    """Slotted in-process view of a stored patient item."""
+    patient_id: str
+    first_name: str
+    last_name: str
+    date_of_birth: str
+    email: str
+    phone: str = ''
+    nhs_number: str = ''
+    address: Optional[Dict[str, Any]] = None
+    emergency_contact: Optional[Dict[str, Any]] = None
+    medical_info: Optional[Dict[str, Any]] = None
+    practice_id: str = ''
+    preferred_gp_id: str = ''
+    registration_date: str = ''
+    status: str = 'active'
+    created_by: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    
+    @classmethod
+    def from_item(cls, item: Mapping) -> 'PatientRecord':
+        """Build a record from a DynamoDB item, ignoring attributes outside the schema."""
+        return cls(**{name: item[name] for name in cls.__slots__ if name in item})
+
+# Every stored patient attribute except the potentially large medical_info
+_NON_MEDICAL_ATTRIBUTES = [field for field in PatientRecord.__slots__ if field != 'medical_info']
+
 def prepare_patient_response(
-    patient: Dict[str, Any], 
+    patient: Union[Mapping, PatientRecord], 
     user_role: str, 
     include_medical: bool = False, 
     include_appointments: bool = False
@@ -96,55 +140,57 @@ def prepare_patient_response(
     Prepare patient data for response based on user role and requested information.
     """
     
+    # Any mapping will do (items from boto3 are dicts; fixtures may be read-only views)
+    if isinstance(patient, Mapping):
+        patient = PatientRecord.from_item(patient)
+    
+    is_elevated = user_role in ELEVATED_ROLES
+    
     # Base patient information (always included)
     response_data = {
-        'patient_id': patient['patient_id'],
-        'first_name': patient['first_name'],
-        'last_name': patient['last_name'],
-        'date_of_birth': patient['date_of_birth'],
-        'email': patient['email'],
-        'phone': patient.get('phone', ''),
-        'address': patient.get('address', {}),
-        'practice_id': patient.get('practice_id', ''),
-        'preferred_gp_id': patient.get('preferred_gp_id', ''),
-        'registration_date': patient.get('registration_date', ''),
-        'status': patient.get('status', 'active')
+        'patient_id': patient.patient_id,
+        'first_name': patient.first_name,
+        'last_name': patient.last_name,
+        'date_of_birth': patient.date_of_birth,
+        'email': patient.email,
+        'phone': patient.phone,
+        'address': patient.address or {},
+        'practice_id': patient.practice_id,
+        'preferred_gp_id': patient.preferred_gp_id,
+        'registration_date': patient.registration_date,
+        'status': patient.status
     }
     
     # NHS number - only for staff/admin or patient viewing their own record
-    if user_role in ['staff', 'admin']:
-        response_data['nhs_number'] = patient.get('nhs_number', '')
+    if is_elevated:
+        response_data['nhs_number'] = patient.nhs_number
     
     # Emergency contact - only for staff/admin
-    if user_role in ['staff', 'admin']:
-        response_data['emergency_contact'] = patient.get('emergency_contact', {})
+    if is_elevated:
+        response_data['emergency_contact'] = patient.emergency_contact or {}
     
     # Medical information - only if requested and authorized
-    if include_medical and user_role in ['staff', 'admin']:
-        medical_info = patient.get('medical_info', {})
-        response_data['medical_info'] = prepare_medical_info_response(medical_info)
+    if include_medical and is_elevated:
+        response_data['medical_info'] = prepare_medical_info_response(patient.medical_info or {})
     
     # Recent appointments - if requested
     if include_appointments:
         try:
-            recent_appointments = get_recent_appointments(patient['patient_id'])
+            recent_appointments = get_recent_appointments(patient.patient_id)
             response_data['recent_appointments'] = recent_appointments
         except Exception as e:
-            logger.error(f"Error retrieving recent appointments: {str(e)}")
+            logger.error("Error retrieving recent appointments: %s", e)
             response_data['recent_appointments'] = []
     
     return response_data
 
 def prepare_medical_info_response(medical_info: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Prepare medical information for response, handling both legacy and new formats.
-    Returns comprehensive medical data with backward compatibility.
+    Prepare medical information for response in coded form.
+    Records stored before the *_legacy string lists were dropped are lifted on read.
     """
     if not medical_info:
         return {
-            'allergies_legacy': [],
-            'conditions_legacy': [],
-            'medications_legacy': [],
             'allergies': [],
             'conditions': [],
             'medications': [],
@@ -153,11 +199,13 @@ def prepare_medical_info_response(medical_info: Dict[str, Any]) -> Dict[str, Any
             'data_source': 'user_entered'
         }
     
+    # Records written by the current create/update path hold exactly the coded
+    # keys; return them as-is
+    if medical_info.keys() == _MEDICAL_INFO_KEYS:
+        return medical_info
+    
     # Ensure all fields are present for API consistency
     response = {
-        'allergies_legacy': medical_info.get('allergies_legacy', []),
-        'conditions_legacy': medical_info.get('conditions_legacy', []),
-        'medications_legacy': medical_info.get('medications_legacy', []),
         'allergies': medical_info.get('allergies', []),
         'conditions': medical_info.get('conditions', []),
         'medications': medical_info.get('medications', []),
@@ -166,51 +214,11 @@ def prepare_medical_info_response(medical_info: Dict[str, Any]) -> Dict[str, Any
         'data_source': medical_info.get('data_source', 'user_entered')
     }
     
-    # If only legacy data exists, ensure coded fields are populated
-    if not response['allergies'] and response['allergies_legacy']:
-        response['allergies'] = [
-            {
-                'display_text': allergy,
-                'code': None,
-                'system': None,
-                'verified': False,
-                'severity': None,
-                'reaction': [],
-                'onset_date': None
-            }
-            for allergy in response['allergies_legacy']
-        ]
-    
-    if not response['conditions'] and response['conditions_legacy']:
-        response['conditions'] = [
-            {
-                'display_text': condition,
-                'code': None,
-                'system': None,
-                'verified': False,
-                'clinical_status': 'active',
-                'onset_date': None,
-                'resolved_date': None
-            }
-            for condition in response['conditions_legacy']
-        ]
-    
-    if not response['medications'] and response['medications_legacy']:
-        response['medications'] = [
-            {
-                'display_text': medication,
-                'code': None,
-                'system': None,
-                'verified': False,
-                'dosage': None,
-                'frequency': None,
-                'route': None,
-                'start_date': None,
-                'end_date': None,
-                'prescriber': None
-            }
-            for medication in response['medications_legacy']
-        ]
+    # Older records may only have legacy string lists; lift them into coded items
+    for field, template in MEDICAL_FIELDS:
+        legacy_items = medical_info.get(f'{field}_legacy')
+        if not response[field] and legacy_items:
+            response[field] = [{**template, 'display_text': item} for item in legacy_items]
     
     return response
 
@@ -219,12 +227,11 @@ def get_recent_appointments(patient_id: str, limit: int = 10) -> list:
     Get recent appointments for a patient.
     """
     try:
-        from datetime import datetime, timezone, timedelta
-        
         # Get appointments from the last 6 months
         start_date = (datetime.now(timezone.utc) - timedelta(days=180)).strftime('%Y-%m-%d')
         end_date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
         
+        # Newest first, projected down to the fields returned to the client
         appointments = db.query_items(
             'appointments',
             index_name='PatientIndex',
@@ -234,30 +241,30 @@ def get_recent_appointments(patient_id: str, limit: int = 10) -> list:
                 ':start_date': start_date,
                 ':end_date': end_date
             },
-            limit=limit
+            limit=limit,
+            projection_expression=(
+                'appointment_id, appointment_datetime, appointment_type, #s, '
+                'reason, practice_id, practitioner_id'
+            ),
+            expression_attribute_names={'#s': 'status'},
+            scan_index_forward=False
         )
         
-        # Sort by appointment datetime (most recent first)
-        appointments.sort(
-            key=lambda x: x.get('appointment_datetime', ''), 
-            reverse=True
-        )
+        # The index sorts by appointment_date only, so order same-day appointments by time
+        recent = heapq.nlargest(limit, appointments, key=lambda x: x.get('appointment_datetime', ''))
         
-        # Return simplified appointment data
-        simplified_appointments = []
-        for appt in appointments:
-            simplified_appointments.append({
+        # Every summary carries the same keys; unset optional fields come back empty
+        summaries = []
+        for appt in recent:
+            summary = {
                 'appointment_id': appt['appointment_id'],
-                'appointment_datetime': appt['appointment_datetime'],
-                'appointment_type': appt.get('appointment_type', ''),
-                'status': appt.get('status', ''),
-                'reason': appt.get('reason', ''),
-                'practice_id': appt.get('practice_id', ''),
-                'practitioner_id': appt.get('practitioner_id', '')
-            })
-        
-        return simplified_appointments
+                'appointment_datetime': appt['appointment_datetime']
+            }
+            for field in _APPOINTMENT_SUMMARY_FIELDS:
+                summary[field] = appt.get(field, '')
+            summaries.append(summary)
+        return summaries
         
     except Exception as e:
-        logger.error(f"Error getting recent appointments: {str(e)}")
+        logger.error("Error getting recent appointments: %s", e)
         return []
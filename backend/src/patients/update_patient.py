@@ -1,128 +1,83 @@
 """
 AWS Lambda function for updating patient records.
-Handles patient data updates with dual storage medical information and proper authorization.
+Handles patient data updates with coded medical information and proper authorization.
 """
 
-import json
 import logging
 import uuid
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from botocore.exceptions import ClientError
 
 # Import utilities
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from database import db
-from utils.auth import require_auth
-from responses import (
+from utils.database import db, release_sentinel, uniqueness_sentinel
+from utils.auth import ELEVATED_ROLES, require_auth
+from utils.medical import MEDICAL_FIELDS
+from utils.request import RequestBodyError, parse_json_body
+from utils.responses import (
     success_response, bad_request_response, not_found_response,
-    forbidden_response, internal_error_response, handle_lambda_error
+    forbidden_response, conflict_response, internal_error_response, handle_lambda_error
 )
 from utils.validators import validate_patient_data
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-def process_medical_info_update(medical_data: Dict[str, Any]) -> Dict[str, Any]:
+# Fields each role may change; name and email are cleaned as strings
+_UPDATABLE_PATIENT = frozenset({
+    'first_name', 'last_name', 'email', 'phone', 'address',
+    'emergency_contact', 'preferred_gp_id'
+})
+_UPDATABLE_STAFF = _UPDATABLE_PATIENT | {'practice_id', 'status'}
+_STRING_FIELDS = frozenset({'first_name', 'last_name', 'email'})
+# Updated fields that validate_patient_data checks; the address postcode is added separately
+_VALIDATED_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'medical_info')
+
+# Response fields with their defaults, beyond the required name and email fields.
+# Empty container defaults are shared; responses are only ever serialized.
+_PUBLIC_RESPONSE_FIELDS = (
+    ('phone', ''),
+    ('address', {}),
+    ('practice_id', ''),
+    ('preferred_gp_id', ''),
+    ('status', 'active'),
+    ('updated_at', None)
+)
+
+_STAFF_RESPONSE_FIELDS = (
+    ('nhs_number', ''),
+    ('date_of_birth', ''),
+    ('emergency_contact', {}),
+    ('registration_date', ''),
+    ('medical_info', {})
+)
+
+def process_medical_info_update(medical_data: Dict[str, Any], now_iso: str = None) -> Dict[str, Any]:
     """
-    Process medical information updates to support dual storage format.
-    Handles both legacy string arrays and new coded medical data.
+    Process medical information updates into coded storage format.
+    Plain strings, and the older *_legacy string lists, are lifted into coded items.
     """
     processed = {
-        'allergies_legacy': [],
-        'conditions_legacy': [],
-        'medications_legacy': [],
         'allergies': [],
         'conditions': [],
         'medications': [],
         'notes': medical_data.get('notes', ''),
-        'last_updated': datetime.now(timezone.utc).isoformat(),
+        'last_updated': now_iso or datetime.now(timezone.utc).isoformat(),
         'data_source': medical_data.get('data_source', 'user_entered')
     }
     
-    # Handle legacy string format (backward compatibility)
-    if 'allergies' in medical_data and isinstance(medical_data['allergies'], list):
-        if medical_data['allergies'] and isinstance(medical_data['allergies'][0], str):
-            # Legacy string format
-            processed['allergies_legacy'] = medical_data['allergies']
-            # Auto-convert to coded format with basic structure
-            processed['allergies'] = [
-                {
-                    'display_text': allergy,
-                    'code': None,
-                    'system': None,
-                    'verified': False,
-                    'severity': None,
-                    'reaction': [],
-                    'onset_date': None
-                }
-                for allergy in medical_data['allergies']
-            ]
-        else:
-            # New coded format
-            processed['allergies'] = medical_data['allergies']
-            # Extract display text for legacy compatibility
-            processed['allergies_legacy'] = [
-                item.get('display_text', '') for item in medical_data['allergies']
-            ]
-    
-    # Handle conditions (same logic)
-    if 'conditions' in medical_data and isinstance(medical_data['conditions'], list):
-        if medical_data['conditions'] and isinstance(medical_data['conditions'][0], str):
-            processed['conditions_legacy'] = medical_data['conditions']
-            processed['conditions'] = [
-                {
-                    'display_text': condition,
-                    'code': None,
-                    'system': None,
-                    'verified': False,
-                    'clinical_status': 'active',
-                    'onset_date': None,
-                    'resolved_date': None
-                }
-                for condition in medical_data['conditions']
-            ]
-        else:
-            processed['conditions'] = medical_data['conditions']
-            processed['conditions_legacy'] = [
-                item.get('display_text', '') for item in medical_data['conditions']
-            ]
-    
-    # Handle medications (same logic)
-    if 'medications' in medical_data and isinstance(medical_data['medications'], list):
-        if medical_data['medications'] and isinstance(medical_data['medications'][0], str):
-            processed['medications_legacy'] = medical_data['medications']
-            processed['medications'] = [
-                {
-                    'display_text': medication,
-                    'code': None,
-                    'system': None,
-                    'verified': False,
-                    'dosage': None,
-                    'frequency': None,
-                    'route': None,
-                    'start_date': None,
-                    'end_date': None,
-                    'prescriber': None
-                }
-                for medication in medical_data['medications']
-            ]
-        else:
-            processed['medications'] = medical_data['medications']
-            processed['medications_legacy'] = [
-                item.get('display_text', '') for item in medical_data['medications']
+    for field, template in MEDICAL_FIELDS:
+        items = medical_data.get(field)
+        # Legacy lists only stand in when no coded list was sent
+        if not items:
+            items = medical_data.get(f'{field}_legacy')
+        # Exact type checks: parsed JSON only ever yields plain lists and strs
+        if type(items) is list and items:
+            processed[field] = [
+                {**template, 'display_text': item} if type(item) is str else item
+                for item in items
             ]
     
-    # Handle explicit legacy fields if provided
-    if 'allergies_legacy' in medical_data:
-        processed['allergies_legacy'] = medical_data['allergies_legacy']
-    if 'conditions_legacy' in medical_data:
-        processed['conditions_legacy'] = medical_data['conditions_legacy']
-    if 'medications_legacy' in medical_data:
-        processed['medications_legacy'] = medical_data['medications_legacy']
-    
     return processed
 
 @handle_lambda_error
@@ -166,6 +121,8 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """
     
     try:
+        now_iso = datetime.now(timezone.utc).isoformat()
+        
         # Extract patient ID from path
         path_params = event.get('pathParameters') or {}
         patient_id = path_params.get('patient_id')
@@ -174,110 +131,194 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
             return bad_request_response("Patient ID is required")
         
         # Parse request body
-        if 'body' not in event:
-            return bad_request_response("Request body is required")
-        
-        body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
+        body = parse_json_body(event)
         user = event.get('user', {})
         
-        # Get existing patient record
-        existing_patient = db.get_item('patients', {'patient_id': patient_id})
-        if not existing_patient:
-            return not_found_response("Patient not found")
-        
         # Authorization check
         user_role = user.get('role')
         user_id = user.get('user_id')
         user_practice_id = user.get('practice_id')
+        is_elevated = user_role in ELEVATED_ROLES
         
         if user_role == 'patient':
             # Patients can only update their own records
             if patient_id != user_id:
                 return forbidden_response("Patients can only update their own records")
-        elif user_role in ['staff', 'admin']:
-            # Staff can only update patients from their practice
-            if existing_patient.get('practice_id') != user_practice_id:
-                return forbidden_response("Staff can only update patients from their practice")
         
         # Prepare update data
         update_data = {}
-        updatable_fields = [
-            'first_name', 'last_name', 'email', 'phone', 'address', 
-            'emergency_contact', 'preferred_gp_id'
-        ]
         
         # Only staff/admin can update certain fields
-        if user_role in ['staff', 'admin']:
-            updatable_fields.extend(['practice_id', 'status'])
+        allowed_fields = _UPDATABLE_STAFF if is_elevated else _UPDATABLE_PATIENT
         
         # Process standard fields
-        for field in updatable_fields:
-            if field in body:
-                if field in ['first_name', 'last_name', 'email']:
-                    # Validate and clean string fields
-                    value = str(body[field]).strip()
-                    if value:
-                        update_data[field] = value
-                else:
-                    update_data[field] = body[field]
+        for field, value in body.items():
+            if field not in allowed_fields:
+                continue
+            if field in _STRING_FIELDS:
+                # Validate and clean string fields
+                value = str(value).strip()
+                if field == 'email':
+                    # Stored lowercased, as on create, so the EmailIndex and sentinels match
+                    value = value.lower()
+                if value:
+                    update_data[field] = value
+            else:
+                update_data[field] = value
         
-        # Process medical information with dual storage
-        if 'medical_info' in body and user_role in ['staff', 'admin']:
+        # Process medical information into coded form
+        if 'medical_info' in body and is_elevated:
             # Only staff/admin can update medical information
-            update_data['medical_info'] = process_medical_info_update(body['medical_info'])
+            update_data['medical_info'] = process_medical_info_update(body['medical_info'], now_iso=now_iso)
+        
+        # Add update timestamp
+        update_data['updated_at'] = now_iso
         
-        # Add update timestamp and user
-        update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+        # Validate updated data; only the changed fields need checking, as the
+        # stored record was validated on write
+        validation_data = {field: update_data[field] for field in _VALIDATED_FIELDS if field in update_data}
+        if 'medical_info' in update_data:
+            # Check what was sent; processing drops the *_legacy lists it lifts from
+            validation_data['medical_info'] = body['medical_info']
+        address = update_data.get('address')
+        if isinstance(address, dict) and address.get('postcode'):
+            validation_data['postcode'] = address['postcode']
+        if validation_data:
+            validation_result = validate_patient_data(validation_data, partial=True)
+            if not validation_result.valid:
+                return bad_request_response("Validation failed", validation_result.errors)
         
-        # Validate updated data
-        if any(field in update_data for field in ['first_name', 'last_name', 'email']):
-            # Create validation data by merging existing and new data
-            validation_data = {**existing_patient, **update_data}
-            validation_result = validate_patient_data(validation_data)
-            if not validation_result['valid']:
-                return bad_request_response("Validation failed", validation_result['errors'])
+        # Existence and practice ownership are enforced by the write itself, so
+        # the happy path is a single round trip with no read-then-write race
+        condition_expression = 'attribute_exists(patient_id)'
+        condition_values = None
+        if is_elevated:
+            # Staff can only update patients from their practice
+            condition_expression += ' AND practice_id = :caller_practice_id'
+            condition_values = {':caller_practice_id': user_practice_id}
+        
+        # An email change also moves its uniqueness sentinel, which needs the current address
+        current = None
+        if 'email' in update_data:
+            current = db.get_item('patients', {'patient_id': patient_id})
+            if not current:
+                return not_found_response("Patient not found")
+            if is_elevated and current.get('practice_id') != user_practice_id:
+                return forbidden_response("Staff can only update patients from their practice")
+            if current.get('email') == update_data['email']:
+                current = None
+            elif check_email_taken(update_data['email'], patient_id):
+                return conflict_response("Patient with this email already exists")
         
         # Update the patient record
-        updated_patient = db.update_item('patients', {'patient_id': patient_id}, update_data)
+        if current is not None:
+            try:
+                updated_patient = update_patient_email(
+                    patient_id, current, update_data, condition_expression, condition_values, now_iso
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise
+                reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+                if reasons[1:2] == ['ConditionalCheckFailed']:
+                    return conflict_response("Patient with this email already exists")
+                if reasons[:1] == ['ConditionalCheckFailed']:
+                    return conflict_response("Patient record was changed by another request; please retry")
+                raise
+        else:
+            try:
+                updated_patient = db.update_item_dict(
+                    'patients',
+                    {'patient_id': patient_id},
+                    update_data,
+                    condition_expression=condition_expression,
+                    condition_values=condition_values
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                # The old item comes back only when it exists but failed the practice check
+                if 'Item' in e.response:
+                    return forbidden_response("Staff can only update patients from their practice")
+                return not_found_response("Patient not found")
         
         # Prepare response (exclude sensitive information based on user role)
         response_data = prepare_update_response(updated_patient, user_role)
         
-        logger.info(f"Patient updated: {patient_id} by {user_id}")
+        logger.info("Patient updated: %s by %s", patient_id, user_id)
         
         return success_response(response_data, "Patient updated successfully")
         
-    except json.JSONDecodeError:
-        return bad_request_response("Invalid JSON in request body")
+    except RequestBodyError as e:
+        return bad_request_response(str(e))
     except Exception as e:
-        logger.error(f"Error updating patient: {str(e)}")
+        logger.error("Error updating patient: %s", e)
         return internal_error_response("Failed to update patient record")
 
+def update_patient_email(
+    patient_id: str,
+    current: Dict[str, Any],
+    update_data: Dict[str, Any],
+    condition_expression: str,
+    condition_values: Optional[Dict[str, Any]],
+    now_iso: str
+) -> Dict[str, Any]:
+    """
+    Apply an update that changes the patient's email in one transaction: the record
+    update, a sentinel reserving the new address and release of the old one.
+    The update is conditioned on the email read beforehand, so a concurrent change
+    cancels the transaction. Cancellation reasons line up as (update, reserve, release).
+    """
+    old_email = current.get('email')
+    operations = [
+        {
+            'table': 'patients',
+            'action': 'update',
+            'key': {'patient_id': patient_id},
+            'updates': update_data,
+            'condition': f'{condition_expression} AND email = :current_email',
+            'condition_values': {**(condition_values or {}), ':current_email': old_email}
+        },
+        uniqueness_sentinel(f"EMAIL#{update_data['email']}", patient_id, now_iso)
+    ]
+    if old_email:
+        operations.append(release_sentinel(f"EMAIL#{old_email}", patient_id))
+    
+    db.transact_write_items(operations)
+    return {**current, **update_data}
+
+def check_email_taken(email: str, patient_id: str) -> bool:
+    """
+    Check whether another patient already uses the given (normalised) email.
+    Catches records written before email sentinels existed.
+    """
+    patients = db.query_items(
+        'patients',
+        index_name='EmailIndex',
+        key_condition='email = :email',
+        expression_values={':email': email},
+        projection_expression='patient_id'
+    )
+    return any(patient['patient_id'] != patient_id for patient in patients)
+
 def prepare_update_response(patient: Dict[str, Any], user_role: str) -> Dict[str, Any]:
     """
     Prepare patient data for update response based on user role.
     """
+    get = patient.get
+    
     response_data = {
         'patient_id': patient['patient_id'],
         'first_name': patient['first_name'],
         'last_name': patient['last_name'],
-        'email': patient['email'],
-        'phone': patient.get('phone', ''),
-        'address': patient.get('address', {}),
-        'practice_id': patient.get('practice_id', ''),
-        'preferred_gp_id': patient.get('preferred_gp_id', ''),
-        'status': patient.get('status', 'active'),
-        'updated_at': patient.get('updated_at')
+        'email': patient['email']
     }
+    for field, default in _PUBLIC_RESPONSE_FIELDS:
+        response_data[field] = get(field, default)
     
     # Include additional fields for staff/admin
-    if user_role in ['staff', 'admin']:
-        response_data.update({
-            'nhs_number': patient.get('nhs_number', ''),
-            'date_of_birth': patient.get('date_of_birth', ''),
-            'emergency_contact': patient.get('emergency_contact', {}),
-            'registration_date': patient.get('registration_date', ''),
-            'medical_info': patient.get('medical_info', {})
-        })
+    if user_role in ELEVATED_ROLES:
+        for field, default in _STAFF_RESPONSE_FIELDS:
+            response_data[field] = get(field, default)
     
     return response_data
@@ -5,16 +5,13 @@ Handles practice data retrieval for patients and staff.
 
 import json
 import logging
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
 
 # Import utilities
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-
-from database import db
-from utils.auth import require_auth
-from responses import (
+from utils.database import db
+from utils.auth import ELEVATED_ROLES, require_auth
+from utils.responses import (
     success_response, bad_request_response, not_found_response,
     internal_error_response, handle_lambda_error
 )
@@ -22,6 +19,29 @@ from responses import (
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Reused across warm invocations so the staff lookup can overlap the practice read
+_lookup_executor = ThreadPoolExecutor(max_workers=2)
+
+# Response fields with their defaults, beyond the required practice_id and name.
+# Empty container defaults are shared; responses are only ever serialized.
+_PUBLIC_FIELDS = (
+    ('address', {}),
+    ('phone', ''),
+    ('email', ''),
+    ('website', ''),
+    ('services', []),
+    ('opening_hours', {}),
+    ('status', 'active')
+)
+
+_STAFF_FIELDS = (
+    ('registration_number', ''),
+    ('ccg_code', ''),
+    ('ods_code', ''),
+    ('created_at', ''),
+    ('updated_at', '')
+)
+
 @handle_lambda_error
 @require_auth(allowed_roles=['patient', 'staff', 'admin'])
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
@@ -50,69 +70,82 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         include_schedule = query_params.get('include_schedule', 'false').lower() == 'true'
         
         user = event.get('user', {})
+        user_role = user.get('role')
+        is_elevated = user_role in ELEVATED_ROLES
+        
+        # Start the staff lookup alongside the practice read when it'll be needed
+        staff_future = None
+        if include_staff and is_elevated:
+            staff_future = _lookup_executor.submit(get_practice_staff, practice_id)
         
         # Get practice record
         practice = db.get_item('practices', {'practice_id': practice_id})
         if not practice:
             return not_found_response("Practice not found")
         
+        staff_list = None
+        if staff_future is not None:
+            try:
+                staff_list = staff_future.result()
+            except Exception as e:
+                logger.error("Error retrieving practice staff: %s", e)
+                staff_list = []
+        
         # Prepare response data
         response_data = prepare_practice_response(
             practice, 
-            user.get('role'), 
+            user_role, 
             include_staff, 
-            include_schedule
+            include_schedule,
+            staff_list=staff_list
         )
         
-        logger.info(f"Practice data retrieved: {practice_id} by {user.get('user_id')}")
+        logger.info("Practice data retrieved: %s by %s", practice_id, user.get('user_id'))
         
         return success_response(response_data)
         
     except Exception as e:
-        logger.error(f"Error retrieving practice: {str(e)}")
+        logger.error("Error retrieving practice: %s", e)
         return internal_error_response("Failed to retrieve practice information")
 
 def prepare_practice_response(
     practice: Dict[str, Any], 
     user_role: str, 
     include_staff: bool = False, 
-    include_schedule: bool = False
+    include_schedule: bool = False,
+    staff_list: Optional[list] = None
 ) -> Dict[str, Any]:
     """
     Prepare practice data for response based on user role and requested information.
+    A staff_list fetched by the caller is used as-is; otherwise staff are looked up here.
     """
     
+    get = practice.get
+    is_elevated = user_role in ELEVATED_ROLES
+    
     # Base practice information (always included)
     response_data = {
         'practice_id': practice['practice_id'],
-        'name': practice['name'],
-        'address': practice.get('address', {}),
-        'phone': practice.get('phone', ''),
-        'email': practice.get('email', ''),
-        'website': practice.get('website', ''),
-        'services': practice.get('services', []),
-        'opening_hours': practice.get('opening_hours', {}),
-        'status': practice.get('status', 'active')
+        'name': practice['name']
     }
+    for field, default in _PUBLIC_FIELDS:
+        response_data[field] = get(field, default)
     
     # Additional information for staff/admin
-    if user_role in ['staff', 'admin']:
-        response_data.update({
-            'registration_number': practice.get('registration_number', ''),
-            'ccg_code': practice.get('ccg_code', ''),
-            'ods_code': practice.get('ods_code', ''),
-            'created_at': practice.get('created_at', ''),
-            'updated_at': practice.get('updated_at', '')
-        })
+    if is_elevated:
+        for field, default in _STAFF_FIELDS:
+            response_data[field] = get(field, default)
     
     # Staff information - if requested and authorized
-    if include_staff and user_role in ['staff', 'admin']:
-        try:
-            staff_list = get_practice_staff(practice['practice_id'])
+    if include_staff and is_elevated:
+        if staff_list is not None:
             response_data['staff'] = staff_list
-        except Exception as e:
-            logger.error(f"Error retrieving practice staff: {str(e)}")
-            response_data['staff'] = []
+        else:
+            try:
+                response_data['staff'] = get_practice_staff(practice['practice_id'])
+            except Exception as e:
+                logger.error("Error retrieving practice staff: %s", e)
+                response_data['staff'] = []
     
     # Practice schedule - if requested
     if include_schedule:
@@ -150,5 +183,5 @@ def get_practice_staff(practice_id: str) -> list:
         return staff_data
         
     except Exception as e:
-        logger.error(f"Error getting practice staff: {str(e)}")
+        logger.error("Error getting practice staff: %s", e)
         return []
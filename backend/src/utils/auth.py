@@ -5,60 +5,166 @@ Integrates with AWS Cognito for secure user authentication.
 
 import jwt
 import boto3
+import hashlib
+import json
 import os
 import logging
-import requests
-from typing import Dict, Optional, Any
+import time
+import certifi
+import urllib3
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Tuple
 from functools import wraps
 from botocore.exceptions import ClientError
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from jwt.utils import base64url_decode
 
 logger = logging.getLogger(__name__)
 
+# Roles that act on behalf of a practice rather than as the patient
+ELEVATED_ROLES = frozenset({'staff', 'admin'})
+
+# Cognito client shared by every AuthManager in this container
+_COGNITO_CLIENT = None
+
+def _get_cognito():
+    """Build the Cognito client on first use and reuse it afterwards."""
+    global _COGNITO_CLIENT
+    if _COGNITO_CLIENT is None:
+        _COGNITO_CLIENT = boto3.client('cognito-idp', region_name=os.getenv('AWS_REGION', 'eu-west-2'))
+    return _COGNITO_CLIENT
+
+# Kept alive across warm invocations so a JWKS refetch after key rotation
+# reuses the TLS connection instead of handshaking again
+_HTTP = urllib3.PoolManager(num_pools=1, maxsize=2, cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())
+
+# JWKS documents keyed by user pool, shared across warm invocations
+_JWKS_CACHE: Dict[str, Dict[str, Any]] = {}
+
+# Parsed public keys per user pool, keyed by kid, with the time they were loaded
+_KEYS_CACHE: Dict[str, Dict[str, Any]] = {}
+_KEYS_LOADED_AT: Dict[str, float] = {}
+
+# Minimum gap between JWKS refreshes triggered by an unknown kid
+_JWKS_REFRESH_INTERVAL = 60
+
+# Users from recently verified tokens, keyed by token digest with an expiry time,
+# so a token reused across requests in a warm container skips signature checks
+_TOKEN_CACHE: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+_TOKEN_CACHE_SIZE = 512
+_TOKEN_CACHE_TTL = 60
+
 class AuthManager:
     """Handles JWT token validation and user authentication."""
     
     def __init__(self):
-        self.cognito_client = boto3.client('cognito-idp', region_name=os.getenv('AWS_REGION', 'eu-west-2'))
+        self.cognito_client = _get_cognito()
         self.user_pool_id = os.getenv('USER_POOL_ID')
         self.client_id = os.getenv('USER_POOL_CLIENT_ID')
         self.region = os.getenv('AWS_REGION', 'eu-west-2')
-        self._jwks = None
     
     def get_jwks(self) -> Dict[str, Any]:
         """Get JSON Web Key Set from Cognito."""
-        if not self._jwks:
+        jwks = _JWKS_CACHE.get(self.user_pool_id)
+        if not jwks:
             jwks_url = f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}/.well-known/jwks.json"
-            response = requests.get(jwks_url)
-            self._jwks = response.json()
-        return self._jwks
+            response = _HTTP.request('GET', jwks_url, timeout=2.0, retries=1)
+            if response.status != 200:
+                # Don't cache a failed fetch; the next miss will try again
+                logger.error("Failed to fetch JWKS: HTTP %s", response.status)
+                return {'keys': []}
+            jwks = _JWKS_CACHE[self.user_pool_id] = json.loads(response.data)
+        return jwks
+    
+    def get_signing_key(self, kid: str) -> Optional[Any]:
+        """Get the public key for a kid, refreshing the JWKS once if it's unknown."""
+        keys = _KEYS_CACHE.get(self.user_pool_id)
+        if keys is not None and kid in keys:
+            return keys[kid]
+        
+        # Unknown kid may mean Cognito rotated its keys; throttle refetches
+        # so tokens with bogus kids can't force a download per request
+        if keys is not None:
+            if time.monotonic() - _KEYS_LOADED_AT[self.user_pool_id] < _JWKS_REFRESH_INTERVAL:
+                return None
+            _JWKS_CACHE.pop(self.user_pool_id, None)
+        
+        jwks_keys = self.get_jwks()['keys']
+        if not jwks_keys:
+            # A failed fetch must not be cached either, or every token would be
+            # rejected until the refresh interval ran out
+            return None
+        
+        keys = _KEYS_CACHE[self.user_pool_id] = {
+            jwk['kid']: jwt.algorithms.RSAAlgorithm.from_jwk(jwk)
+            for jwk in jwks_keys
+        }
+        _KEYS_LOADED_AT[self.user_pool_id] = time.monotonic()
+        return keys.get(kid)
     
     def validate_token(self, token: str) -> Optional[Dict[str, Any]]:
         """Validate JWT token and return user claims."""
         try:
-            # Get the key ID from token header
-            unverified_header = jwt.get_unverified_header(token)
-            kid = unverified_header['kid']
+            # Split once; the signature is checked against the raw header.payload bytes
+            try:
+                header_b64, payload_b64, signature_b64 = token.split('.')
+                header = json.loads(base64url_decode(header_b64))
+                signature = base64url_decode(signature_b64)
+            except (ValueError, TypeError) as e:
+                raise jwt.DecodeError(f"Malformed token: {e}")
+            if not isinstance(header, dict):
+                raise jwt.DecodeError("Malformed token: invalid header")
+            
+            if header.get('alg') != 'RS256':
+                raise jwt.InvalidAlgorithmError("The specified alg value is not allowed")
             
             # Find the correct key
-            jwks = self.get_jwks()
-            key = None
-            for jwk in jwks['keys']:
-                if jwk['kid'] == kid:
-                    key = jwt.algorithms.RSAAlgorithm.from_jwk(jwk)
-                    break
+            key = self.get_signing_key(header.get('kid'))
             
             if not key:
                 logger.error("Unable to find appropriate key")
                 return None
             
-            # Verify the token
-            payload = jwt.decode(
-                token,
-                key,
-                algorithms=['RS256'],
-                audience=self.client_id,
-                issuer=f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}"
-            )
+            # Verify the signature with the cached public key
+            try:
+                key.verify(
+                    signature,
+                    f"{header_b64}.{payload_b64}".encode(),
+                    padding.PKCS1v15(),
+                    hashes.SHA256()
+                )
+            except InvalidSignature:
+                raise jwt.InvalidSignatureError("Signature verification failed")
+            
+            try:
+                payload = json.loads(base64url_decode(payload_b64))
+            except ValueError as e:
+                raise jwt.DecodeError(f"Invalid payload: {e}")
+            if not isinstance(payload, dict):
+                raise jwt.DecodeError("Invalid payload: not a JSON object")
+            
+            # Verify the claims
+            now = time.time()
+            if 'exp' not in payload:
+                raise jwt.MissingRequiredClaimError('exp')
+            for claim in ('exp', 'nbf'):
+                # Exact type check: bool is an int subclass but never a timestamp
+                if claim in payload and type(payload[claim]) not in (int, float):
+                    raise jwt.InvalidTokenError(f"The {claim} claim must be a number")
+            if payload['exp'] <= now:
+                raise jwt.ExpiredSignatureError("Signature has expired")
+            if payload.get('nbf', 0) > now:
+                raise jwt.ImmatureSignatureError("The token is not yet valid (nbf)")
+            
+            audience = payload.get('aud')
+            if not (audience == self.client_id
+                    or (isinstance(audience, list) and self.client_id in audience)):
+                raise jwt.InvalidAudienceError("Audience doesn't match")
+            
+            if payload.get('iss') != f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}":
+                raise jwt.InvalidIssuerError("Invalid issuer")
             
             return payload
             
@@ -66,16 +172,25 @@ class AuthManager:
             logger.error("Token has expired")
             return None
         except jwt.InvalidTokenError as e:
-            logger.error(f"Invalid token: {e}")
+            logger.error("Invalid token: %s", e)
             return None
     
     def get_user_from_token(self, token: str) -> Optional[Dict[str, Any]]:
         """Extract user information from validated token."""
+        cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        now = time.time()
+        
+        cached = _TOKEN_CACHE.get(cache_key)
+        if cached and cached[1] > now:
+            _TOKEN_CACHE.move_to_end(cache_key)
+            # Hand out a copy; handlers are free to modify the user they're given
+            return dict(cached[0])
+        
         payload = self.validate_token(token)
         if not payload:
             return None
         
-        return {
+        user = {
             'user_id': payload.get('sub'),
             'email': payload.get('email'),
             'nhs_number': payload.get('custom:nhs_number'),
@@ -83,6 +198,13 @@ class AuthManager:
             'practice_id': payload.get('custom:practice_id'),
             'username': payload.get('cognito:username')
         }
+        
+        # Never cache past the token's own expiry
+        _TOKEN_CACHE[cache_key] = (user, min(payload['exp'], now + _TOKEN_CACHE_TTL))
+        if len(_TOKEN_CACHE) > _TOKEN_CACHE_SIZE:
+            _TOKEN_CACHE.popitem(last=False)
+        
+        return dict(user)
     
     def register_user(self, email: str, password: str, nhs_number: str = None, 
                      role: str = 'patient', practice_id: str = None) -> Dict[str, Any]:
@@ -117,11 +239,11 @@ class AuthManager:
                 Permanent=True
             )
             
-            logger.info(f"User registered successfully: {email}")
+            logger.info("User registered successfully: %s", email)
             return {'user_id': response['User']['Username'], 'email': email}
             
         except ClientError as e:
-            logger.error(f"Error registering user: {e}")
+            logger.error("Error registering user: %s", e)
             raise
     
     def authenticate_user(self, email: str, password: str) -> Dict[str, Any]:
@@ -145,11 +267,14 @@ class AuthManager:
             }
             
         except ClientError as e:
-            logger.error(f"Authentication failed: {e}")
+            logger.error("Authentication failed: %s", e)
             raise
 
 def require_auth(allowed_roles: list = None):
     """Decorator to require authentication for Lambda functions."""
+    # Normalise once at decoration time for O(1) role checks per request
+    allowed_roles = frozenset(allowed_roles) if allowed_roles else None
+    
     def decorator(func):
         @wraps(func)
         def wrapper(event, context):
@@ -163,8 +288,7 @@ def require_auth(allowed_roles: list = None):
                     }
                 
                 token = auth_header.split(' ')[1]
-                auth_manager = AuthManager()
-                user = auth_manager.get_user_from_token(token)
+                user = auth.get_user_from_token(token)
                 
                 if not user:
                     return {
@@ -184,7 +308,7 @@ def require_auth(allowed_roles: list = None):
                 return func(event, context)
                 
             except Exception as e:
-                logger.error(f"Auth error: {e}")
+                logger.error("Auth error: %s", e)
                 return {
                     'statusCode': 500,
                     'body': '{"error": "Internal server error"}'
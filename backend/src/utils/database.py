@@ -6,37 +6,126 @@ Provides centralized database operations for the NHS appointment booking system.
 import boto3
 import os
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+import time
+from typing import Dict, List, Optional, Any, Tuple
 from botocore.exceptions import ClientError
 from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+# Sentinel items reserving unique patient attributes share the patients table,
+# under patient_ids with this prefix
+SENTINEL_PREFIX = 'UNIQ#'
+
+# Retries for keys BatchGetItem leaves unprocessed, doubling the delay from the base each time
+_BATCH_GET_MAX_RETRIES = 5
+_BATCH_GET_BASE_DELAY = 0.05
+
+def _dynamodb_config() -> Dict[str, Any]:
+    """DynamoDB connection settings (local or AWS) from the environment."""
+    dynamodb_config = {
+        'region_name': os.getenv('AWS_REGION', 'eu-west-2')
+    }
+    
+    # Use local endpoint if specified (for local development)
+    if os.getenv('DYNAMODB_ENDPOINT'):
+        dynamodb_config['endpoint_url'] = os.getenv('DYNAMODB_ENDPOINT')
+        # Use dummy credentials for local DynamoDB
+        dynamodb_config['aws_access_key_id'] = os.getenv('AWS_ACCESS_KEY_ID', 'local')
+        dynamodb_config['aws_secret_access_key'] = os.getenv('AWS_SECRET_ACCESS_KEY', 'local')
+    
+    return dynamodb_config
+
+def _update_params(updates: Dict[str, Any]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """
+    Build a SET expression with its attribute names and values from a dict of updates.
+    Names are aliased so reserved words (e.g. 'status') need no special handling, and
+    updated_at is stamped unless the caller supplied one.
+    """
+    if 'updated_at' not in updates:
+        updates = {**updates, 'updated_at': datetime.now(timezone.utc).isoformat()}
+    
+    expression_names = {f"#a{i}": field for i, field in enumerate(updates)}
+    expression_values = {f":v{i}": value for i, value in enumerate(updates.values())}
+    update_expression = 'SET ' + ', '.join([f"#a{i} = :v{i}" for i in range(len(updates))])
+    return update_expression, expression_names, expression_values
+
+def uniqueness_sentinel(unique_key: str, patient_id: str, now_iso: str) -> Dict[str, Any]:
+    """
+    Build a transactional put for a sentinel item that reserves a unique patient
+    attribute (e.g. NHS#<number>, EMAIL#<address>) in the patients table.
+    The put fails its condition if another patient already holds the value.
+    """
+    return {
+        'table': 'patients',
+        'item': {
+            'patient_id': f'{SENTINEL_PREFIX}{unique_key}',
+            'owner_patient_id': patient_id,
+            'created_at': now_iso
+        },
+        'condition': 'attribute_not_exists(patient_id)'
+    }
+
+def release_sentinel(unique_key: str, patient_id: str) -> Dict[str, Any]:
+    """
+    Build a transactional delete that frees a value reserved by uniqueness_sentinel.
+    Records created before sentinels existed have none, so a missing sentinel is
+    fine; one held by a different patient fails the condition.
+    """
+    return {
+        'table': 'patients',
+        'action': 'delete',
+        'key': {'patient_id': f'{SENTINEL_PREFIX}{unique_key}'},
+        'condition': 'attribute_not_exists(patient_id) OR owner_patient_id = :sentinel_owner',
+        'condition_values': {':sentinel_owner': patient_id}
+    }
+
 class DatabaseManager:
     """Centralized DynamoDB operations manager."""
     
     def __init__(self):
-        # Configure DynamoDB connection (local or AWS)
-        dynamodb_config = {
-            'region_name': os.getenv('AWS_REGION', 'eu-west-2')
+        self.table_names = {
+            'appointments': os.getenv('APPOINTMENTS_TABLE'),
+            'patients': os.getenv('PATIENTS_TABLE'),
+            'practices': os.getenv('PRACTICES_TABLE')
         }
         
-        # Use local endpoint if specified (for local development)
-        if os.getenv('DYNAMODB_ENDPOINT'):
-            dynamodb_config['endpoint_url'] = os.getenv('DYNAMODB_ENDPOINT')
-            # Use dummy credentials for local DynamoDB
-            dynamodb_config['aws_access_key_id'] = os.getenv('AWS_ACCESS_KEY_ID', 'local')
-            dynamodb_config['aws_secret_access_key'] = os.getenv('AWS_SECRET_ACCESS_KEY', 'local')
-        
-        self.dynamodb = boto3.resource('dynamodb', **dynamodb_config)
-        self.appointments_table = self.dynamodb.Table(os.getenv('APPOINTMENTS_TABLE'))
-        self.patients_table = self.dynamodb.Table(os.getenv('PATIENTS_TABLE'))
-        self.practices_table = self.dynamodb.Table(os.getenv('PRACTICES_TABLE'))
+        # boto3 resources aren't thread-safe and handlers use the database from
+        # worker threads, so each thread builds its own resource on first use
+        # and keeps it across warm invocations
+        self._local = threading.local()
+    
+    def _create_dynamodb(self):
+        """Build a DynamoDB resource for the calling thread."""
+        # Sessions aren't thread-safe either, so don't go through the default one
+        return boto3.session.Session().resource('dynamodb', **_dynamodb_config())
+    
+    def _thread_resources(self) -> threading.local:
+        """The calling thread's resource and table handles, built on first use."""
+        local = self._local
+        if not hasattr(local, 'dynamodb'):
+            dynamodb = self._create_dynamodb()
+            local.tables = {
+                name: dynamodb.Table(table_name) for name, table_name in self.table_names.items()
+            }
+            local.dynamodb = dynamodb
+        return local
+    
+    @property
+    def dynamodb(self):
+        """The calling thread's DynamoDB resource."""
+        return self._thread_resources().dynamodb
+    
+    @property
+    def tables(self) -> Dict[str, Any]:
+        """The calling thread's table handles by short name, used by every operation below."""
+        return self._thread_resources().tables
     
     def create_item(self, table_name: str, item: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new item in the specified table."""
         try:
-            table = getattr(self, f"{table_name}_table")
+            table = self.tables[table_name]
             
             # Add timestamps
             now = datetime.now(timezone.utc).isoformat()
@@ -44,29 +133,121 @@ class DatabaseManager:
             item['updated_at'] = now
             
             response = table.put_item(Item=item)
-            logger.info(f"Created item in {table_name}: {item.get('id', 'unknown')}")
+            logger.info("Created item in %s: %s", table_name, item.get('id', 'unknown'))
             return item
             
         except ClientError as e:
-            logger.error(f"Error creating item in {table_name}: {e}")
+            logger.error("Error creating item in %s: %s", table_name, e)
             raise
     
-    def get_item(self, table_name: str, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Get an item from the specified table."""
+    def get_item(self, table_name: str, key: Dict[str, Any],
+                 projection: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get an item from the specified table.
+        If projection is given, only those attributes are read and returned.
+        """
         try:
-            table = getattr(self, f"{table_name}_table")
-            response = table.get_item(Key=key)
+            table = self.tables[table_name]
+            
+            if projection:
+                response = table.get_item(
+                    Key=key,
+                    ProjectionExpression=', '.join([f"#p{i}" for i in range(len(projection))]),
+                    ExpressionAttributeNames={f"#p{i}": name for i, name in enumerate(projection)}
+                )
+            else:
+                response = table.get_item(Key=key)
             return response.get('Item')
             
         except ClientError as e:
-            logger.error(f"Error getting item from {table_name}: {e}")
+            logger.error("Error getting item from %s: %s", table_name, e)
+            raise
+    
+    def batch_get_items(self, keys: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get items from one or more tables in a single BatchGetItem request.
+        Takes (table_name, key) pairs (up to 100) and returns found items grouped by table name.
+        Unprocessed keys are retried with exponential backoff; if some are still
+        unprocessed after _BATCH_GET_MAX_RETRIES retries a RuntimeError is raised.
+        """
+        try:
+            table_names = {}
+            request_items = {}
+            for table_name, key in keys:
+                table = self.tables[table_name]
+                table_names[table.name] = table_name
+                request_items.setdefault(table.name, {'Keys': []})['Keys'].append(key)
+            
+            results = {table_name: [] for table_name in table_names.values()}
+            for attempt in range(_BATCH_GET_MAX_RETRIES + 1):
+                if attempt:
+                    # Back off before retrying, as unprocessed keys usually mean throttling
+                    time.sleep(_BATCH_GET_BASE_DELAY * 2 ** (attempt - 1))
+                response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                for name, items in response.get('Responses', {}).items():
+                    results[table_names[name]].extend(items)
+                # Retry any keys DynamoDB didn't get to (throttling / size limits)
+                request_items = response.get('UnprocessedKeys')
+                if not request_items:
+                    return results
+            
+            raise RuntimeError(
+                f"BatchGetItem left keys unprocessed after {_BATCH_GET_MAX_RETRIES} retries"
+            )
+            
+        except ClientError as e:
+            logger.error("Error batch getting items: %s", e)
+            raise
+    
+    def transact_write_items(self, operations: List[Dict[str, Any]]) -> None:
+        """
+        Atomically apply several writes with TransactWriteItems.
+        Each operation is {'table': table_name, 'action': 'put' | 'update' | 'delete', ...}:
+        - put (the default): 'item'
+        - update: 'key' and 'updates', a dict of attribute values as for update_item_dict
+        - delete: 'key'
+        and may carry 'condition' (a ConditionExpression) with 'condition_values'.
+        If any condition fails the whole write is cancelled and a TransactionCanceledException
+        ClientError is raised whose 'CancellationReasons' line up with the operations;
+        a failed update's reason includes the old 'Item' when it exists.
+        """
+        try:
+            transact_items = []
+            for operation in operations:
+                table = self.tables[operation['table']]
+                action = operation.get('action', 'put')
+                # The resource's client serializes attribute values itself
+                request = {'TableName': table.name}
+                if action == 'put':
+                    request['Item'] = operation['item']
+                else:
+                    request['Key'] = operation['key']
+                
+                expression_values = {}
+                if action == 'update':
+                    update_expression, expression_names, expression_values = _update_params(operation['updates'])
+                    request['UpdateExpression'] = update_expression
+                    request['ExpressionAttributeNames'] = expression_names
+                if operation.get('condition'):
+                    request['ConditionExpression'] = operation['condition']
+                    request['ReturnValuesOnConditionCheckFailure'] = 'ALL_OLD'
+                    if operation.get('condition_values'):
+                        expression_values.update(operation['condition_values'])
+                if expression_values:
+                    request['ExpressionAttributeValues'] = expression_values
+                transact_items.append({action.capitalize(): request})
+            
+            self.dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+            
+        except ClientError as e:
+            logger.error("Error in transactional write: %s", e)
             raise
     
     def update_item(self, table_name: str, key: Dict[str, Any], 
                    update_expression: str, expression_values: Dict[str, Any]) -> Dict[str, Any]:
         """Update an item in the specified table."""
         try:
-            table = getattr(self, f"{table_name}_table")
+            table = self.tables[table_name]
             
             # Add updated timestamp
             expression_values[':updated_at'] = datetime.now(timezone.utc).isoformat()
@@ -81,27 +262,63 @@ class DatabaseManager:
             return response['Attributes']
             
         except ClientError as e:
-            logger.error(f"Error updating item in {table_name}: {e}")
+            logger.error("Error updating item in %s: %s", table_name, e)
+            raise
+    
+    def update_item_dict(self, table_name: str, key: Dict[str, Any], updates: Dict[str, Any],
+                        condition_expression: Optional[str] = None,
+                        condition_values: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Update an item from a dict of attribute values.
+        Attribute names are aliased so reserved words (e.g. 'status') need no special handling.
+        """
+        try:
+            table = self.tables[table_name]
+            
+            update_expression, expression_names, expression_values = _update_params(updates)
+            
+            update_params = {
+                'Key': key,
+                'UpdateExpression': update_expression,
+                'ExpressionAttributeNames': expression_names,
+                'ExpressionAttributeValues': expression_values,
+                'ReturnValues': "ALL_NEW"
+            }
+            if condition_expression:
+                update_params['ConditionExpression'] = condition_expression
+                # Lets callers tell a missing item from a failed condition without another read
+                update_params['ReturnValuesOnConditionCheckFailure'] = 'ALL_OLD'
+                if condition_values:
+                    expression_values.update(condition_values)
+            
+            response = table.update_item(**update_params)
+            return response['Attributes']
+            
+        except ClientError as e:
+            logger.error("Error updating item in %s: %s", table_name, e)
             raise
     
     def delete_item(self, table_name: str, key: Dict[str, Any]) -> bool:
         """Delete an item from the specified table."""
         try:
-            table = getattr(self, f"{table_name}_table")
+            table = self.tables[table_name]
             table.delete_item(Key=key)
-            logger.info(f"Deleted item from {table_name}: {key}")
+            logger.info("Deleted item from %s: %s", table_name, key)
             return True
             
         except ClientError as e:
-            logger.error(f"Error deleting item from {table_name}: {e}")
+            logger.error("Error deleting item from %s: %s", table_name, e)
             raise
     
     def query_items(self, table_name: str, index_name: Optional[str] = None,
                    key_condition: str = None, expression_values: Dict[str, Any] = None,
-                   filter_expression: str = None, limit: int = None) -> List[Dict[str, Any]]:
+                   filter_expression: str = None, limit: int = None,
+                   projection_expression: str = None,
+                   expression_attribute_names: Dict[str, str] = None,
+                   scan_index_forward: bool = True) -> List[Dict[str, Any]]:
         """Query items from the specified table."""
         try:
-            table = getattr(self, f"{table_name}_table")
+            table = self.tables[table_name]
             
             query_params = {}
             if key_condition:
@@ -114,19 +331,37 @@ class DatabaseManager:
                 query_params['IndexName'] = index_name
             if limit:
                 query_params['Limit'] = limit
+            if projection_expression:
+                query_params['ProjectionExpression'] = projection_expression
+            if expression_attribute_names:
+                query_params['ExpressionAttributeNames'] = expression_attribute_names
+            if not scan_index_forward:
+                query_params['ScanIndexForward'] = False
             
             response = table.query(**query_params)
             return response.get('Items', [])
             
         except ClientError as e:
-            logger.error(f"Error querying items from {table_name}: {e}")
+            logger.error("Error querying items from %s: %s", table_name, e)
             raise
     
     def scan_items(self, table_name: str, filter_expression: str = None,
                   expression_values: Dict[str, Any] = None, limit: int = None) -> List[Dict[str, Any]]:
-        """Scan items from the specified table."""
+        """
+        Scan items from the specified table.
+        Uniqueness sentinels are filtered out of patients scans, so only patient
+        records come back. As with any filter, Limit counts items before filtering.
+        """
         try:
-            table = getattr(self, f"{table_name}_table")
+            table = self.tables[table_name]
+            
+            if table_name == 'patients':
+                sentinel_filter = 'NOT begins_with(patient_id, :sentinel_prefix)'
+                if filter_expression:
+                    filter_expression = f'({filter_expression}) AND {sentinel_filter}'
+                else:
+                    filter_expression = sentinel_filter
+                expression_values = {**(expression_values or {}), ':sentinel_prefix': SENTINEL_PREFIX}
             
             scan_params = {}
             if filter_expression:
@@ -140,7 +375,7 @@ class DatabaseManager:
             return response.get('Items', [])
             
         except ClientError as e:
-            logger.error(f"Error scanning items from {table_name}: {e}")
+            logger.error("Error scanning items from %s: %s", table_name, e)
             raise
 
 # Global database manager instance
@@ -0,0 +1,49 @@
+"""
+Shared shapes for coded medical information.
+Used by the patient handlers to lift legacy string entries into coded items.
+"""
+
+from types import MappingProxyType
+
+# Default coded-item shapes used when converting legacy string entries.
+# Read-only so the shallow copies taken per item can't leak edits back;
+# 'reaction' defaults to an immutable empty tuple for the same reason.
+ALLERGY_TEMPLATE = MappingProxyType({
+    'display_text': None,
+    'code': None,
+    'system': None,
+    'verified': False,
+    'severity': None,
+    'reaction': (),
+    'onset_date': None
+})
+
+CONDITION_TEMPLATE = MappingProxyType({
+    'display_text': None,
+    'code': None,
+    'system': None,
+    'verified': False,
+    'clinical_status': 'active',
+    'onset_date': None,
+    'resolved_date': None
+})
+
+MEDICATION_TEMPLATE = MappingProxyType({
+    'display_text': None,
+    'code': None,
+    'system': None,
+    'verified': False,
+    'dosage': None,
+    'frequency': None,
+    'route': None,
+    'start_date': None,
+    'end_date': None,
+    'prescriber': None
+})
+
+# Coded item lists in medical_info, with the template each one's items are lifted into
+MEDICAL_FIELDS = (
+    ('allergies', ALLERGY_TEMPLATE),
+    ('conditions', CONDITION_TEMPLATE),
+    ('medications', MEDICATION_TEMPLATE)
+)
@@ -3,11 +3,20 @@ Data models and schemas for the NHS appointment booking system.
 Defines the structure of data entities and their relationships.
 """
 
+import re
+from dataclasses import dataclass
 from typing import Dict, List, Optional, Any
-from datetime import datetime
-from pydantic import BaseModel, Field, validator
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
 from enum import Enum
 
+# Shared patterns. Field constraints take the pattern source, which pydantic-core
+# compiles once per model; the email check runs in Python so it's compiled here.
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_DATE_PATTERN = r'^\d{4}-\d{2}-\d{2}$'
+_APPT_DT_PATTERN = r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{3})?Z?$'
+_HHMM_PATTERN = r'^\d{2}:\d{2}-\d{2}:\d{2}$|^Closed$'
+
 class AppointmentStatus(str, Enum):
     SCHEDULED = "scheduled"
     COMPLETED = "completed"
@@ -95,15 +104,9 @@ class Medication(CodedMedicalItem):
 # Enhanced Medical Information Model
 class MedicalInfo(BaseModel):
     """
-    Comprehensive medical information supporting both current string-based
-    storage and future NHS-coded data for seamless migration.
+    Comprehensive medical information stored in NHS-coded form only.
+    Plain strings are accepted on input and wrapped as uncoded items.
     """
-    # Legacy string-based fields (maintained for backward compatibility)
-    allergies_legacy: List[str] = Field(default_factory=list, description="Legacy string allergies")
-    conditions_legacy: List[str] = Field(default_factory=list, description="Legacy string conditions")
-    medications_legacy: List[str] = Field(default_factory=list, description="Legacy string medications")
-    
-    # NHS-ready coded fields
     allergies: List[MedicalAllergy] = Field(default_factory=list, description="Coded allergy information")
     conditions: List[MedicalCondition] = Field(default_factory=list, description="Coded medical conditions")
     medications: List[Medication] = Field(default_factory=list, description="Coded medication information")
@@ -113,12 +116,19 @@ class MedicalInfo(BaseModel):
     last_updated: Optional[str] = Field(None, description="When medical info was last updated")
     data_source: Optional[str] = Field(default="user_entered", description="Source of medical data")
 
+    @field_validator('allergies', 'conditions', 'medications', mode='before')
+    @classmethod
+    def wrap_plain_strings(cls, v):
+        if isinstance(v, list):
+            return [{'display_text': item} if isinstance(item, str) else item for item in v]
+        return v
+
 # Patient Model
 class Patient(BaseModel):
     patient_id: str = Field(..., min_length=1)
     first_name: str = Field(..., min_length=1, max_length=50)
     last_name: str = Field(..., min_length=1, max_length=50)
-    date_of_birth: str = Field(..., regex=r'^\d{4}-\d{2}-\d{2}$')
+    date_of_birth: str = Field(..., pattern=_DATE_PATTERN)
     email: str = Field(..., min_length=5, max_length=100)
     phone: Optional[str] = Field(None, max_length=20)
     nhs_number: Optional[str] = Field(None, min_length=10, max_length=10)
@@ -133,23 +143,22 @@ class Patient(BaseModel):
     created_at: str
     updated_at: str
 
-    @validator('email')
+    @field_validator('email', mode='after')
+    @classmethod
     def validate_email(cls, v):
-        import re
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(pattern, v):
+        if not _EMAIL_RE.match(v):
             raise ValueError('Invalid email format')
         return v.lower()
 
 # Opening Hours Model
 class OpeningHours(BaseModel):
-    monday: Optional[str] = Field(None, regex=r'^\d{2}:\d{2}-\d{2}:\d{2}$|^Closed$')
-    tuesday: Optional[str] = Field(None, regex=r'^\d{2}:\d{2}-\d{2}:\d{2}$|^Closed$')
-    wednesday: Optional[str] = Field(None, regex=r'^\d{2}:\d{2}-\d{2}:\d{2}$|^Closed$')
-    thursday: Optional[str] = Field(None, regex=r'^\d{2}:\d{2}-\d{2}:\d{2}$|^Closed$')
-    friday: Optional[str] = Field(None, regex=r'^\d{2}:\d{2}-\d{2}:\d{2}$|^Closed$')
-    saturday: Optional[str] = Field(None, regex=r'^\d{2}:\d{2}-\d{2}:\d{2}$|^Closed$')
-    sunday: Optional[str] = Field(None, regex=r'^\d{2}:\d{2}-\d{2}:\d{2}$|^Closed$')
+    monday: Optional[str] = Field(None, pattern=_HHMM_PATTERN)
+    tuesday: Optional[str] = Field(None, pattern=_HHMM_PATTERN)
+    wednesday: Optional[str] = Field(None, pattern=_HHMM_PATTERN)
+    thursday: Optional[str] = Field(None, pattern=_HHMM_PATTERN)
+    friday: Optional[str] = Field(None, pattern=_HHMM_PATTERN)
+    saturday: Optional[str] = Field(None, pattern=_HHMM_PATTERN)
+    sunday: Optional[str] = Field(None, pattern=_HHMM_PATTERN)
 
 # Practice Model (Healthcare Access Point)
 class Practice(BaseModel):
@@ -192,7 +201,7 @@ class Appointment(BaseModel):
     patient_id: str = Field(..., min_length=1)
     practice_id: str = Field(..., min_length=1)
     practitioner_id: Optional[str] = None
-    appointment_datetime: str = Field(..., regex=r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{3})?Z?$')
+    appointment_datetime: str = Field(..., pattern=_APPT_DT_PATTERN)
     appointment_type: AppointmentType
     duration_minutes: int = Field(default=30, ge=5, le=120)
     reason: Optional[str] = Field(None, max_length=500)
@@ -204,17 +213,23 @@ class Appointment(BaseModel):
     cancelled_at: Optional[str] = None
     cancelled_by: Optional[str] = None
 
-    @validator('appointment_datetime')
-    def validate_appointment_datetime(cls, v):
+    @field_validator('appointment_datetime', mode='after')
+    @classmethod
+    def validate_appointment_datetime(cls, v, info: ValidationInfo):
         try:
-            # Parse and validate the datetime
-            dt = datetime.fromisoformat(v.replace('Z', '+00:00'))
-            # Ensure it's in the future (basic check)
-            if dt <= datetime.now(dt.tzinfo):
-                raise ValueError('Appointment must be in the future')
-            return v
+            # fromisoformat accepts a trailing 'Z' from Python 3.11
+            dt = datetime.fromisoformat(v)
         except ValueError as e:
             raise ValueError(f'Invalid datetime format: {e}')
+        # Naive times are UTC, as everywhere else in the system
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        # Batch callers validate against one clock reading passed as context={'now': ...}
+        now = (info.context or {}).get('now') or datetime.now(timezone.utc)
+        # Ensure it's in the future (basic check)
+        if dt <= now:
+            raise ValueError('Appointment must be in the future')
+        return v
 
 # API Request/Response Models
 class CreateAppointmentRequest(BaseModel):
@@ -261,13 +276,17 @@ class RegisterRequest(BaseModel):
     practice_id: Optional[str] = None
 
 # Response Models
-class APIResponse(BaseModel):
+# Built internally from already-validated data, so these are plain slotted
+# dataclasses rather than Pydantic models. kw_only keeps the declared field order.
+@dataclass(slots=True, kw_only=True)
+class APIResponse:
     data: Optional[Any] = None
     message: Optional[str] = None
     timestamp: str
     errors: Optional[Dict[str, Any]] = None
 
-class AuthResponse(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class AuthResponse:
     access_token: str
     id_token: str
     refresh_token: str
@@ -297,30 +316,109 @@ class FHIRAppointment(BaseModel):
 
     def to_internal_appointment(self) -> Appointment:
         """Convert FHIR appointment to internal model."""
-        # Implementation would map FHIR fields to internal model
-        pass
+        # Participant references look like "Patient/<id>"; index them by resource type
+        refs = {}
+        for participant in self.participant:
+            resource_type, _, ref_id = participant.get('actor', {}).get('reference', '').partition('/')
+            refs.setdefault(resource_type, ref_id)
+        
+        coding = (self.appointmentType or {}).get('code')
+        reason = self.reasonCode[0].get('text') if self.reasonCode else None
+        created = self.created or self.start
+        
+        # Fields come straight off an already-validated FHIR resource, so skip
+        # revalidating them (which would also reject past appointments on sync)
+        return Appointment.model_construct(
+            appointment_id=self.id,
+            patient_id=refs.get('Patient', ''),
+            practice_id=refs.get('Location', ''),
+            practitioner_id=refs.get('Practitioner'),
+            appointment_datetime=self.start,
+            appointment_type=_FHIR_TO_INTERNAL_TYPE.get(coding, AppointmentType.ROUTINE),
+            duration_minutes=self.minutesDuration or 30,
+            reason=reason,
+            notes=self.description,
+            status=_FHIR_TO_INTERNAL_STATUS.get(self.status, AppointmentStatus.SCHEDULED),
+            created_by='fhir',
+            created_at=created,
+            updated_at=created,
+        )
 
     @classmethod
     def from_internal_appointment(cls, appointment: Appointment) -> 'FHIRAppointment':
         """Convert internal appointment to FHIR format."""
-        # Implementation would map internal model to FHIR fields
-        pass
+        start = datetime.fromisoformat(appointment.appointment_datetime)
+        end = start + timedelta(minutes=appointment.duration_minutes)
+        
+        participant = [
+            {'actor': {'reference': f"Patient/{appointment.patient_id}"}, 'status': 'accepted'},
+            {'actor': {'reference': f"Location/{appointment.practice_id}"}, 'status': 'accepted'},
+        ]
+        if appointment.practitioner_id:
+            participant.append(
+                {'actor': {'reference': f"Practitioner/{appointment.practitioner_id}"}, 'status': 'accepted'}
+            )
+        
+        return cls.model_construct(
+            id=appointment.appointment_id,
+            status=_INTERNAL_TO_FHIR_STATUS[appointment.status],
+            appointmentType={'code': appointment.appointment_type.value},
+            reasonCode=[{'text': appointment.reason}] if appointment.reason else None,
+            description=appointment.notes,
+            start=appointment.appointment_datetime,
+            end=end.isoformat(),
+            minutesDuration=appointment.duration_minutes,
+            participant=participant,
+            created=appointment.created_at,
+        )
+
+# FHIR R4 appointment statuses. Every pre-visit state books as scheduled
+_INTERNAL_TO_FHIR_STATUS = {
+    AppointmentStatus.SCHEDULED: 'booked',
+    AppointmentStatus.COMPLETED: 'fulfilled',
+    AppointmentStatus.CANCELLED: 'cancelled',
+    AppointmentStatus.NO_SHOW: 'noshow',
+}
+_FHIR_TO_INTERNAL_STATUS = {
+    'proposed': AppointmentStatus.SCHEDULED,
+    'pending': AppointmentStatus.SCHEDULED,
+    'booked': AppointmentStatus.SCHEDULED,
+    'arrived': AppointmentStatus.SCHEDULED,
+    'fulfilled': AppointmentStatus.COMPLETED,
+    'cancelled': AppointmentStatus.CANCELLED,
+    'noshow': AppointmentStatus.NO_SHOW,
+    'entered-in-error': AppointmentStatus.CANCELLED,
+}
+
+# Appointment type codes: our own values (what from_internal_appointment sends),
+# plus the HL7 v2-0276 codes other FHIR systems use. Missing or unrecognised
+# codes book as routine, as unknown statuses book as scheduled
+_FHIR_TO_INTERNAL_TYPE = {
+    **{appointment_type.value: appointment_type for appointment_type in AppointmentType},
+    'ROUTINE': AppointmentType.ROUTINE,
+    'CHECKUP': AppointmentType.ROUTINE,
+    'FOLLOWUP': AppointmentType.FOLLOW_UP,
+    'WALKIN': AppointmentType.URGENT,
+    'EMERGENCY': AppointmentType.URGENT,
+}
 
 # Cross-Practice Usage Tracking Model
-class PatientPracticeUsage(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class PatientPracticeUsage:
     """
     Track patient usage across different healthcare access points.
     Replaces traditional GP registration for funding and continuity tracking.
+    Maintained internally from booked appointments, so it isn't re-validated.
     """
-    usage_id: str = Field(..., min_length=1)
-    patient_id: str = Field(..., min_length=1)
-    nhs_number: str = Field(..., min_length=10, max_length=10)
-    practice_id: str = Field(..., min_length=1)
+    usage_id: str
+    patient_id: str
+    nhs_number: str
+    practice_id: str
     access_point_type: HealthcareAccessPointType
     first_visit_date: str
     last_visit_date: str
-    total_appointments: int = Field(default=1, ge=1)
-    is_primary_practice: bool = Field(default=False)  # Patient's designated "home" practice
+    total_appointments: int = 1
+    is_primary_practice: bool = False  # Patient's designated "home" practice
     created_at: str
     updated_at: str
 
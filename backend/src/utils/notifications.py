@@ -4,53 +4,72 @@ Handles email and SMS notifications for appointments and reminders.
 """
 
 import boto3
+import json
 import os
 import logging
-from typing import Dict, Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from string import Template
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timezone
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
 
-class NotificationManager:
-    """Manages email and SMS notifications."""
-    
-    def __init__(self):
-        self.ses_client = boto3.client('ses', region_name=os.getenv('AWS_REGION', 'eu-west-2'))
-        self.sns_client = boto3.client('sns', region_name=os.getenv('AWS_REGION', 'eu-west-2'))
-        self.from_email = os.getenv('FROM_EMAIL', 'noreply@nhsappointments.nhs.uk')
-    
-    def send_appointment_confirmation(
-        self, 
-        patient_email: str, 
-        patient_name: str,
-        appointment_details: Dict[str, Any]
-    ) -> bool:
-        """Send appointment confirmation email."""
-        try:
-            subject = "NHS Appointment Confirmation"
-            
-            # Format appointment datetime
-            appt_datetime = datetime.fromisoformat(
-                appointment_details['appointment_datetime'].replace('Z', '+00:00')
-            )
-            formatted_datetime = appt_datetime.strftime('%A, %d %B %Y at %I:%M %p')
-            
-            html_body = f"""
+# Sends are network-bound, so fan them out. The client pools are sized to match
+# so workers never wait on or discard a connection
+_SEND_WORKERS = 32
+_send_executor = ThreadPoolExecutor(max_workers=_SEND_WORKERS)
+
+# SES and SNS clients come from one session and are shared by every
+# NotificationManager in this container; keepalive holds connections open
+# across warm invocations and adaptive retries back off when throttled
+_SESSION = boto3.session.Session()
+_CLIENT_CONFIG = Config(
+    max_pool_connections=_SEND_WORKERS,
+    retries={'max_attempts': 3, 'mode': 'adaptive'},
+    tcp_keepalive=True
+)
+_CLIENTS: Dict[str, Any] = {}
+
+def _get_client(service: str):
+    """Build the client for a service on first use and reuse it afterwards."""
+    client = _CLIENTS.get(service)
+    if client is None:
+        client = _CLIENTS[service] = _SESSION.client(
+            service, region_name=os.getenv('AWS_REGION', 'eu-west-2'), config=_CLIENT_CONFIG
+        )
+    return client
+
+# SES template names already created or updated by this container
+_REGISTERED_TEMPLATES = set()
+
+# SES accepts at most 50 destinations per SendBulkTemplatedEmail call
+_SES_BULK_LIMIT = 50
+
+@lru_cache(maxsize=4096)
+def _format_appointment_datetime(iso: str, fmt: str) -> str:
+    """Format an ISO appointment datetime, cached for repeated sends in reminder sweeps."""
+    # fromisoformat accepts a trailing 'Z' from Python 3.11
+    return datetime.fromisoformat(iso).strftime(fmt)
+
+# Message bodies, parsed once at import; each send only fills in the slots
+_CONFIRMATION_HTML = Template("""
             <html>
             <head></head>
             <body>
                 <h2>Appointment Confirmation</h2>
-                <p>Dear {patient_name},</p>
+                <p>Dear $patient_name,</p>
                 
                 <p>Your appointment has been confirmed with the following details:</p>
                 
                 <div style="background-color: #f0f8ff; padding: 15px; border-left: 4px solid #0078d4;">
-                    <p><strong>Date & Time:</strong> {formatted_datetime}</p>
-                    <p><strong>Type:</strong> {appointment_details.get('appointment_type', '').title()}</p>
-                    <p><strong>Duration:</strong> {appointment_details.get('duration_minutes', 30)} minutes</p>
-                    {f"<p><strong>Reason:</strong> {appointment_details.get('reason', '')}</p>" if appointment_details.get('reason') else ""}
-                    <p><strong>Appointment ID:</strong> {appointment_details['appointment_id']}</p>
+                    <p><strong>Date & Time:</strong> $formatted_datetime</p>
+                    <p><strong>Type:</strong> $appointment_type</p>
+                    <p><strong>Duration:</strong> $duration_minutes minutes</p>
+                    $reason_html
+                    <p><strong>Appointment ID:</strong> $appointment_id</p>
                 </div>
                 
                 <h3>Important Information:</h3>
@@ -66,20 +85,20 @@ class NotificationManager:
                 NHS Appointment Service</p>
             </body>
             </html>
-            """
-            
-            text_body = f"""
+            """)
+
+_CONFIRMATION_TEXT = Template("""
             Appointment Confirmation
             
-            Dear {patient_name},
+            Dear $patient_name,
             
             Your appointment has been confirmed:
             
-            Date & Time: {formatted_datetime}
-            Type: {appointment_details.get('appointment_type', '').title()}
-            Duration: {appointment_details.get('duration_minutes', 30)} minutes
-            {f"Reason: {appointment_details.get('reason', '')}" if appointment_details.get('reason') else ""}
-            Appointment ID: {appointment_details['appointment_id']}
+            Date & Time: $formatted_datetime
+            Type: $appointment_type
+            Duration: $duration_minutes minutes
+            $reason_text
+            Appointment ID: $appointment_id
             
             Important:
             - Arrive 10 minutes early
@@ -88,7 +107,128 @@ class NotificationManager:
             
             Best regards,
             NHS Appointment Service
-            """
+            """)
+
+_REMINDER_HTML = Template("""
+            <html>
+            <head></head>
+            <body>
+                <h2>Appointment Reminder</h2>
+                <p>Dear $patient_name,</p>
+                
+                <p>This is a reminder that you have an appointment scheduled for tomorrow:</p>
+                
+                <div style="background-color: #fff3cd; padding: 15px; border-left: 4px solid #ffc107;">
+                    <p><strong>Date & Time:</strong> $formatted_datetime</p>
+                    <p><strong>Type:</strong> $appointment_type</p>
+                    <p><strong>Appointment ID:</strong> $appointment_id</p>
+                </div>
+                
+                <p>Please remember to:</p>
+                <ul>
+                    <li>Arrive 10 minutes before your appointment</li>
+                    <li>Bring valid ID and your NHS number</li>
+                    <li>Contact the practice if you need to cancel or reschedule</li>
+                </ul>
+                
+                <p>Thank you,<br>
+                NHS Appointment Service</p>
+            </body>
+            </html>
+            """)
+
+# Slots filled per recipient when the reminder goes out as an SES template
+_REMINDER_SLOTS = ('patient_name', 'formatted_datetime', 'appointment_type', 'appointment_id')
+
+_CANCELLATION_HTML = Template("""
+            <html>
+            <head></head>
+            <body>
+                <h2>Appointment Cancelled</h2>
+                <p>Dear $patient_name,</p>
+                
+                <p>Your appointment has been cancelled:</p>
+                
+                <div style="background-color: #f8d7da; padding: 15px; border-left: 4px solid #dc3545;">
+                    <p><strong>Original Date & Time:</strong> $formatted_datetime</p>
+                    <p><strong>Type:</strong> $appointment_type</p>
+                    <p><strong>Appointment ID:</strong> $appointment_id</p>
+                </div>
+                
+                <p>If you need to book a new appointment, please contact the practice or use the NHS appointment booking system.</p>
+                
+                <p>Best regards,<br>
+                NHS Appointment Service</p>
+            </body>
+            </html>
+            """)
+
+_SMS_REMINDER_TEXT = Template("""NHS Appointment Reminder
+            
+Hello $patient_name, you have an appointment tomorrow $formatted_datetime.
+            
+Please arrive 10 minutes early and bring ID.
+            
+To cancel/reschedule, contact your practice.
+            
+Appointment ID: $short_id""")
+
+def _template_fields(patient_name: str, appointment_details: Dict[str, Any], datetime_format: str) -> Dict[str, Any]:
+    """Slot values shared by the notification templates."""
+    appointment_id = appointment_details['appointment_id']
+    reason = appointment_details.get('reason')
+    return {
+        'patient_name': patient_name,
+        'formatted_datetime': _format_appointment_datetime(
+            appointment_details['appointment_datetime'], datetime_format
+        ),
+        'appointment_type': appointment_details.get('appointment_type', '').title(),
+        'duration_minutes': appointment_details.get('duration_minutes', 30),
+        'reason_html': f"<p><strong>Reason:</strong> {reason}</p>" if reason else "",
+        'reason_text': f"Reason: {reason}" if reason else "",
+        'appointment_id': appointment_id,
+        'short_id': appointment_id[:8],
+    }
+
+def _total_sent(futures: List[Future], error_message: str) -> int:
+    """
+    Add up the counts from fanned-out sends. Each result is collected on its own,
+    so one failed send is logged without losing the counts of the others.
+    """
+    sent = 0
+    for future in futures:
+        try:
+            sent += future.result()
+        except Exception:
+            logger.exception(error_message)
+    return sent
+
+class NotificationManager:
+    """Manages email and SMS notifications."""
+    
+    def __init__(self):
+        self.ses_client = _get_client('ses')
+        self.sns_client = _get_client('sns')
+        self.from_email = os.getenv('FROM_EMAIL', 'noreply@nhsappointments.nhs.uk')
+        self.reminder_template = os.getenv('REMINDER_EMAIL_TEMPLATE', 'NHSAppointmentReminder')
+    
+    def send_appointment_confirmation(
+        self, 
+        patient_email: str, 
+        patient_name: str,
+        appointment_details: Dict[str, Any]
+    ) -> bool:
+        """Send appointment confirmation email."""
+        try:
+            subject = "NHS Appointment Confirmation"
+            
+            fields = _template_fields(
+                patient_name, appointment_details, '%A, %d %B %Y at %I:%M %p'
+            )
+            
+            html_body = _CONFIRMATION_HTML.substitute(fields)
+            
+            text_body = _CONFIRMATION_TEXT.substitute(fields)
             
             response = self.ses_client.send_email(
                 Source=self.from_email,
@@ -102,11 +242,11 @@ class NotificationManager:
                 }
             )
             
-            logger.info(f"Confirmation email sent to {patient_email}: {response['MessageId']}")
+            logger.info("Confirmation email sent to %s: %s", patient_email, response['MessageId'])
             return True
             
-        except ClientError as e:
-            logger.error(f"Error sending confirmation email: {e}")
+        except ClientError:
+            logger.exception("Error sending confirmation email")
             return False
     
     def send_appointment_reminder(
@@ -119,38 +259,11 @@ class NotificationManager:
         try:
             subject = "NHS Appointment Reminder - Tomorrow"
             
-            appt_datetime = datetime.fromisoformat(
-                appointment_details['appointment_datetime'].replace('Z', '+00:00')
+            fields = _template_fields(
+                patient_name, appointment_details, '%A, %d %B %Y at %I:%M %p'
             )
-            formatted_datetime = appt_datetime.strftime('%A, %d %B %Y at %I:%M %p')
             
-            html_body = f"""
-            <html>
-            <head></head>
-            <body>
-                <h2>Appointment Reminder</h2>
-                <p>Dear {patient_name},</p>
-                
-                <p>This is a reminder that you have an appointment scheduled for tomorrow:</p>
-                
-                <div style="background-color: #fff3cd; padding: 15px; border-left: 4px solid #ffc107;">
-                    <p><strong>Date & Time:</strong> {formatted_datetime}</p>
-                    <p><strong>Type:</strong> {appointment_details.get('appointment_type', '').title()}</p>
-                    <p><strong>Appointment ID:</strong> {appointment_details['appointment_id']}</p>
-                </div>
-                
-                <p>Please remember to:</p>
-                <ul>
-                    <li>Arrive 10 minutes before your appointment</li>
-                    <li>Bring valid ID and your NHS number</li>
-                    <li>Contact the practice if you need to cancel or reschedule</li>
-                </ul>
-                
-                <p>Thank you,<br>
-                NHS Appointment Service</p>
-            </body>
-            </html>
-            """
+            html_body = _REMINDER_HTML.substitute(fields)
             
             response = self.ses_client.send_email(
                 Source=self.from_email,
@@ -161,13 +274,81 @@ class NotificationManager:
                 }
             )
             
-            logger.info(f"Reminder email sent to {patient_email}: {response['MessageId']}")
+            logger.info("Reminder email sent to %s: %s", patient_email, response['MessageId'])
             return True
             
-        except ClientError as e:
-            logger.error(f"Error sending reminder email: {e}")
+        except ClientError:
+            logger.exception("Error sending reminder email")
             return False
     
+    def _ensure_reminder_template(self) -> None:
+        """Register the reminder email with SES, rendered from the same template as single sends."""
+        if self.reminder_template in _REGISTERED_TEMPLATES:
+            return
+        
+        template = {
+            'TemplateName': self.reminder_template,
+            'SubjectPart': "NHS Appointment Reminder - Tomorrow",
+            'HtmlPart': _REMINDER_HTML.substitute(
+                {name: '{{%s}}' % name for name in _REMINDER_SLOTS}
+            )
+        }
+        try:
+            self.ses_client.create_template(Template=template)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'AlreadyExists':
+                raise
+            # Keep a template left by an earlier deploy in step with this code
+            self.ses_client.update_template(Template=template)
+        _REGISTERED_TEMPLATES.add(self.reminder_template)
+    
+    def _send_reminder_chunk(self, chunk: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """Send one SendBulkTemplatedEmail call; returns how many SES accepted."""
+        # Only the reminder slots are needed, so fill them directly rather than
+        # building the full _template_fields dict for every recipient
+        destinations = [
+            {
+                'Destination': {'ToAddresses': [patient_email]},
+                'ReplacementTemplateData': json.dumps({
+                    'patient_name': patient_name,
+                    'formatted_datetime': _format_appointment_datetime(
+                        appointment_details['appointment_datetime'], '%A, %d %B %Y at %I:%M %p'
+                    ),
+                    'appointment_type': appointment_details.get('appointment_type', '').title(),
+                    'appointment_id': appointment_details['appointment_id']
+                })
+            }
+            for patient_email, patient_name, appointment_details in chunk
+        ]
+        
+        response = self.ses_client.send_bulk_templated_email(
+            Source=self.from_email,
+            Template=self.reminder_template,
+            DefaultTemplateData='{}',
+            Destinations=destinations
+        )
+        return sum(1 for status in response['Status'] if status.get('Status') == 'Success')
+    
+    def send_reminder_batch(
+        self,
+        recipients: List[Tuple[str, str, Dict[str, Any]]]
+    ) -> int:
+        """Send reminder emails in bulk; returns how many SES accepted."""
+        try:
+            self._ensure_reminder_template()
+        except ClientError:
+            logger.exception("Error registering reminder template")
+            return 0
+        
+        futures = [
+            _send_executor.submit(self._send_reminder_chunk, recipients[start:start + _SES_BULK_LIMIT])
+            for start in range(0, len(recipients), _SES_BULK_LIMIT)
+        ]
+        sent = _total_sent(futures, "Error sending reminder chunk")
+        
+        logger.info("Reminder emails sent: %s of %s", sent, len(recipients))
+        return sent
+    
     def send_appointment_cancellation(
         self, 
         patient_email: str, 
@@ -178,33 +359,11 @@ class NotificationManager:
         try:
             subject = "NHS Appointment Cancelled"
             
-            appt_datetime = datetime.fromisoformat(
-                appointment_details['appointment_datetime'].replace('Z', '+00:00')
+            fields = _template_fields(
+                patient_name, appointment_details, '%A, %d %B %Y at %I:%M %p'
             )
-            formatted_datetime = appt_datetime.strftime('%A, %d %B %Y at %I:%M %p')
             
-            html_body = f"""
-            <html>
-            <head></head>
-            <body>
-                <h2>Appointment Cancelled</h2>
-                <p>Dear {patient_name},</p>
-                
-                <p>Your appointment has been cancelled:</p>
-                
-                <div style="background-color: #f8d7da; padding: 15px; border-left: 4px solid #dc3545;">
-                    <p><strong>Original Date & Time:</strong> {formatted_datetime}</p>
-                    <p><strong>Type:</strong> {appointment_details.get('appointment_type', '').title()}</p>
-                    <p><strong>Appointment ID:</strong> {appointment_details['appointment_id']}</p>
-                </div>
-                
-                <p>If you need to book a new appointment, please contact the practice or use the NHS appointment booking system.</p>
-                
-                <p>Best regards,<br>
-                NHS Appointment Service</p>
-            </body>
-            </html>
-            """
+            html_body = _CANCELLATION_HTML.substitute(fields)
             
             response = self.ses_client.send_email(
                 Source=self.from_email,
@@ -215,11 +374,11 @@ class NotificationManager:
                 }
             )
             
-            logger.info(f"Cancellation email sent to {patient_email}: {response['MessageId']}")
+            logger.info("Cancellation email sent to %s: %s", patient_email, response['MessageId'])
             return True
             
-        except ClientError as e:
-            logger.error(f"Error sending cancellation email: {e}")
+        except ClientError:
+            logger.exception("Error sending cancellation email")
             return False
     
     def send_sms_reminder(
@@ -230,32 +389,31 @@ class NotificationManager:
     ) -> bool:
         """Send SMS appointment reminder."""
         try:
-            appt_datetime = datetime.fromisoformat(
-                appointment_details['appointment_datetime'].replace('Z', '+00:00')
+            fields = _template_fields(
+                patient_name, appointment_details, '%d/%m/%Y at %H:%M'
             )
-            formatted_datetime = appt_datetime.strftime('%d/%m/%Y at %H:%M')
-            
-            message = f"""NHS Appointment Reminder
             
-Hello {patient_name}, you have an appointment tomorrow {formatted_datetime}.
-            
-Please arrive 10 minutes early and bring ID.
-            
-To cancel/reschedule, contact your practice.
-            
-Appointment ID: {appointment_details['appointment_id'][:8]}"""
+            message = _SMS_REMINDER_TEXT.substitute(fields)
             
             response = self.sns_client.publish(
                 PhoneNumber=phone_number,
                 Message=message
             )
             
-            logger.info(f"SMS reminder sent to {phone_number}: {response['MessageId']}")
+            logger.info("SMS reminder sent to %s: %s", phone_number, response['MessageId'])
             return True
             
-        except ClientError as e:
-            logger.error(f"Error sending SMS reminder: {e}")
+        except ClientError:
+            logger.exception("Error sending SMS reminder")
             return False
 
+    def send_sms_reminder_batch(
+        self,
+        recipients: List[Tuple[str, str, Dict[str, Any]]]
+    ) -> int:
+        """Send SMS reminders concurrently; returns how many were sent."""
+        futures = [_send_executor.submit(self.send_sms_reminder, *recipient) for recipient in recipients]
+        return _total_sent(futures, "Error sending SMS reminder")
+
 # Global notification manager instance
 notifications = NotificationManager()
@@ -0,0 +1,39 @@
+"""
+Request parsing utilities for Lambda functions.
+Provides consistent request body handling across API endpoints.
+"""
+
+import base64
+import binascii
+from typing import Any, Dict
+
+import orjson
+
+class RequestBodyError(ValueError):
+    """The request body is missing or isn't a JSON object; the message suits a 400 response."""
+
+def parse_json_body(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parse the JSON object body of an API Gateway event.
+    Bodies already parsed into a dict pass through, and base64-encoded bodies are
+    decoded first; orjson parses the bytes directly, so they skip the utf-8 decode.
+    """
+    raw_body = event.get('body')
+    if raw_body is None:
+        raise RequestBodyError("Request body is required")
+    
+    body = raw_body
+    if isinstance(raw_body, (str, bytes)):
+        try:
+            if event.get('isBase64Encoded'):
+                raw_body = base64.b64decode(raw_body)
+            body = orjson.loads(raw_body)
+        except binascii.Error:
+            raise RequestBodyError("Invalid base64 in request body")
+        except orjson.JSONDecodeError:
+            raise RequestBodyError("Invalid JSON in request body")
+    
+    # Valid JSON can still be a list or scalar, which no handler can use
+    if not isinstance(body, dict):
+        raise RequestBodyError("Request body must be a JSON object")
+    return body
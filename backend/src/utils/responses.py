@@ -3,13 +3,37 @@ Standard HTTP response utilities for Lambda functions.
 Provides consistent response formatting across all API endpoints.
 """
 
-import json
 import logging
+from functools import wraps
 from typing import Any, Dict, Optional
-from datetime import datetime
+from datetime import datetime, timezone
+
+import orjson
+
+# Datetimes in bodies are UTC; emit them with a 'Z' suffix like the stored timestamps
+_ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
 
 logger = logging.getLogger(__name__)
 
+# Constant header sets, shared by every response that adds no headers of its own.
+# Plain dicts so the Lambda runtime can serialize them; nothing mutates them
+_BASE_HEADERS = {
+    'Content-Type': 'application/json'
+}
+_CORS_HEADERS = {
+    **_BASE_HEADERS,
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+}
+
+def _now_iso() -> str:
+    """
+    Current UTC time as a naive ISO string with microseconds, the response timestamp format.
+    Each builder calls this once per response, so there is no repeated work to share.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
 def create_response(
     status_code: int,
     body: Any = None,
@@ -18,27 +42,17 @@ def create_response(
 ) -> Dict[str, Any]:
     """Create a standardized HTTP response for API Gateway."""
     
-    default_headers = {
-        'Content-Type': 'application/json'
-    }
-    
-    if cors_enabled:
-        default_headers.update({
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
-        })
-    
+    response_headers = _CORS_HEADERS if cors_enabled else _BASE_HEADERS
     if headers:
-        default_headers.update(headers)
+        response_headers = {**response_headers, **headers}
     
     response_body = body
     if body is not None and not isinstance(body, str):
-        response_body = json.dumps(body, default=str)
+        response_body = orjson.dumps(body, default=str, option=_ORJSON_OPTIONS).decode()
     
     return {
         'statusCode': status_code,
-        'headers': default_headers,
+        'headers': response_headers,
         'body': response_body or ''
     }
 
@@ -49,7 +63,7 @@ def success_response(data: Any = None, message: str = None) -> Dict[str, Any]:
         body['data'] = data
     if message:
         body['message'] = message
-    body['timestamp'] = datetime.utcnow().isoformat()
+    body['timestamp'] = _now_iso()
     
     return create_response(200, body)
 
@@ -60,7 +74,7 @@ def created_response(data: Any = None, message: str = None) -> Dict[str, Any]:
         body['data'] = data
     if message:
         body['message'] = message
-    body['timestamp'] = datetime.utcnow().isoformat()
+    body['timestamp'] = _now_iso()
     
     return create_response(201, body)
 
@@ -68,7 +82,7 @@ def bad_request_response(message: str = "Bad request", errors: Any = None) -> Di
     """Create a bad request response (400)."""
     body = {
         'error': message,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     if errors:
         body['errors'] = errors
@@ -79,7 +93,7 @@ def unauthorized_response(message: str = "Unauthorized") -> Dict[str, Any]:
     """Create an unauthorized response (401)."""
     body = {
         'error': message,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     return create_response(401, body)
 
@@ -87,7 +101,7 @@ def forbidden_response(message: str = "Forbidden") -> Dict[str, Any]:
     """Create a forbidden response (403)."""
     body = {
         'error': message,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     return create_response(403, body)
 
@@ -95,7 +109,7 @@ def not_found_response(message: str = "Resource not found") -> Dict[str, Any]:
     """Create a not found response (404)."""
     body = {
         'error': message,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     return create_response(404, body)
 
@@ -103,7 +117,7 @@ def conflict_response(message: str = "Conflict") -> Dict[str, Any]:
     """Create a conflict response (409)."""
     body = {
         'error': message,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     return create_response(409, body)
 
@@ -111,7 +125,7 @@ def internal_error_response(message: str = "Internal server error") -> Dict[str,
     """Create an internal server error response (500)."""
     body = {
         'error': message,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     return create_response(500, body)
 
@@ -120,26 +134,34 @@ def validation_error_response(errors: Dict[str, Any]) -> Dict[str, Any]:
     body = {
         'error': 'Validation failed',
         'errors': errors,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     return create_response(422, body)
 
+# Expected exception types with their log label and response. Looked up along
+# the exception's MRO so subclasses like JSONDecodeError map to their base
+_ERROR_RESPONSES = {
+    ValueError: ("Validation error", bad_request_response),
+    PermissionError: ("Permission error", forbidden_response),
+    FileNotFoundError: ("Resource not found", not_found_response)
+}
+_HANDLED_ERRORS = tuple(_ERROR_RESPONSES)
+
 def handle_lambda_error(func):
     """Decorator to handle common Lambda function errors."""
+    @wraps(func)
     def wrapper(event, context):
         try:
             return func(event, context)
-        except ValueError as e:
-            logger.error(f"Validation error: {e}")
-            return bad_request_response(str(e))
-        except PermissionError as e:
-            logger.error(f"Permission error: {e}")
-            return forbidden_response(str(e))
-        except FileNotFoundError as e:
-            logger.error(f"Resource not found: {e}")
-            return not_found_response(str(e))
+        except _HANDLED_ERRORS as e:
+            for error_type in type(e).__mro__:
+                if error_type in _ERROR_RESPONSES:
+                    label, responder = _ERROR_RESPONSES[error_type]
+                    break
+            logger.error("%s: %s", label, e)
+            return responder(str(e))
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+            logger.error("Unexpected error: %s", e)
             return internal_error_response("An unexpected error occurred")
     
     return wrapper
@@ -4,9 +4,55 @@ Provides validation for NHS numbers, dates, and other healthcare-specific data.
 """
 
 import re
-import validators
+import time
+from functools import lru_cache
 from datetime import datetime, date, timezone
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, NamedTuple, Optional, Union
+
+# Patterns are compiled once at import instead of going through re's cache per call,
+# and applied with fullmatch so a trailing newline can't slip past a '$' anchor
+_PHONE_SEPARATORS_RE = re.compile(r'[\s\-\(\)]')
+# A trunk 0 or the +44/0044/44 country code, then a 9-10 digit national number
+# not starting with 0. Mobile (7), freephone (800) and local rate (845) numbers
+# are all covered by the one pattern
+_UK_PHONE_RE = re.compile(r'(?:\+44|0044|44|0)[1-9]\d{8,9}')
+
+_EMAIL_RE = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}')
+
+_POSTCODE_RE = re.compile(r'[A-Z]{1,2}\d[A-Z\d]?\s?\d[A-Z]{2}')
+
+# Allowed values and field lists, built once; error messages list values in display order
+_REQUIRED_PATIENT_FIELDS = ('first_name', 'last_name', 'date_of_birth', 'email')
+_REQUIRED_APPOINTMENT_FIELDS = ('patient_id', 'practice_id', 'appointment_datetime', 'appointment_type')
+
+_INVALID_PAYLOAD_ERROR = 'Request body must be a JSON object'
+
+_APPOINTMENT_TYPES = frozenset({'routine', 'urgent', 'follow_up', 'consultation', 'vaccination'})
+_APPOINTMENT_TYPE_ERROR = 'Must be one of: routine, urgent, follow_up, consultation, vaccination'
+
+_ALLERGY_SEVERITIES = frozenset({'mild', 'moderate', 'severe', 'life-threatening'})
+_ALLERGY_SEVERITY_ERROR = 'Severity must be one of: mild, moderate, severe, life-threatening'
+
+_CLINICAL_STATUSES = frozenset({'active', 'resolved', 'inactive'})
+_CLINICAL_STATUS_ERROR = 'Clinical status must be one of: active, resolved, inactive'
+
+_MEDICAL_DATE_FIELDS = ('onset_date', 'resolved_date', 'start_date', 'end_date')
+_ALLERGY_FIELDS = ('severity', 'reaction', 'onset_date')
+_CONDITION_FIELDS = ('clinical_status', 'onset_date', 'resolved_date')
+_MEDICATION_FIELDS = ('dosage', 'frequency', 'route', 'start_date', 'end_date', 'prescriber')
+
+# Item lists in medical_info as (key, item type, optional fields)
+_MEDICAL_LISTS = (
+    ('allergies', 'allergy', _ALLERGY_FIELDS),
+    ('conditions', 'condition', _CONDITION_FIELDS),
+    ('medications', 'medication', _MEDICATION_FIELDS),
+)
+
+# The one coded field each item type restricts to a value set, with its error
+_MEDICAL_ENUM_FIELDS = {
+    'allergy': ('severity', _ALLERGY_SEVERITIES, _ALLERGY_SEVERITY_ERROR),
+    'condition': ('clinical_status', _CLINICAL_STATUSES, _CLINICAL_STATUS_ERROR),
+}
 
 def validate_nhs_number(nhs_number: str) -> bool:
     """
@@ -15,19 +61,34 @@ def validate_nhs_number(nhs_number: str) -> bool:
     """
     if not nhs_number or not isinstance(nhs_number, str):
         return False
-    
-    # Remove spaces and hyphens
-    clean_number = re.sub(r'[\s-]', '', nhs_number)
+    return _nhs_number_valid(nhs_number)
+
+# The string checks below are pure, so results are memoized per input; the public
+# validators keep the type guards so only strings reach the caches
+@lru_cache(maxsize=4096)
+def _nhs_number_valid(nhs_number: str) -> bool:
+    # One pass: skip separators, weight the first nine digits, keep the tenth
+    total = 0
+    count = 0
+    check_digit = 0
+    for char in nhs_number:
+        digit = ord(char) - 48
+        if 0 <= digit <= 9:
+            if count < 9:
+                total += digit * (10 - count)
+            elif count == 9:
+                check_digit = digit
+            else:
+                return False  # More than 10 digits
+            count += 1
+        elif char != '-' and not char.isspace():
+            return False
     
     # Must be exactly 10 digits
-    if not re.match(r'^\d{10}$', clean_number):
+    if count != 10:
         return False
     
-    # Calculate check digit (Modulus 11 algorithm)
-    digits = [int(d) for d in clean_number[:9]]
-    check_digit = int(clean_number[9])
-    
-    total = sum(digit * (10 - i) for i, digit in enumerate(digits))
+    # Check digit (Modulus 11 algorithm)
     remainder = total % 11
     
     if remainder == 0:
@@ -39,38 +100,52 @@ def validate_nhs_number(nhs_number: str) -> bool:
     
     return check_digit == expected_check
 
+def validate_nhs_numbers(nhs_numbers: Iterable[Any]) -> List[bool]:
+    """
+    Validate many NHS numbers at once, e.g. for bulk imports from GP systems.
+    Returns one result per input, in order.
+    """
+    # Bulk inputs are mostly distinct, so go round the memo cache rather than
+    # evicting the numbers that single lookups keep hitting
+    check = _nhs_number_valid.__wrapped__
+    return [bool(n) and isinstance(n, str) and check(n) for n in nhs_numbers]
+
 def validate_email(email: str) -> bool:
     """Validate email address format."""
     if not email or not isinstance(email, str):
         return False
-    return validators.email(email)
+    return bool(_EMAIL_RE.fullmatch(email))
 
 def validate_phone_number(phone: str) -> bool:
     """Validate UK phone number format."""
     if not phone or not isinstance(phone, str):
         return False
-    
+    return _phone_number_valid(phone)
+
+@lru_cache(maxsize=4096)
+def _phone_number_valid(phone: str) -> bool:
     # Remove spaces, hyphens, and brackets
-    clean_phone = re.sub(r'[\s\-\(\)]', '', phone)
-    
-    # UK phone number patterns
-    uk_patterns = [
-        r'^(\+44|0044|44)?[1-9]\d{8,9}$',  # Standard UK numbers
-        r'^(\+44|0044|44)?7\d{9}$',        # Mobile numbers
-        r'^(\+44|0044|44)?800\d{7}$',      # Freephone
-        r'^(\+44|0044|44)?845\d{7}$',      # Local rate
-    ]
+    clean_phone = _PHONE_SEPARATORS_RE.sub('', phone)
     
-    return any(re.match(pattern, clean_phone) for pattern in uk_patterns)
+    return bool(_UK_PHONE_RE.fullmatch(clean_phone))
 
 def validate_postcode(postcode: str) -> bool:
     """Validate UK postcode format."""
     if not postcode or not isinstance(postcode, str):
         return False
-    
-    # UK postcode pattern
-    pattern = r'^[A-Z]{1,2}\d[A-Z\d]?\s?\d[A-Z]{2}$'
-    return bool(re.match(pattern, postcode.upper().strip()))
+    return _postcode_valid(postcode)
+
+@lru_cache(maxsize=4096)
+def _postcode_valid(postcode: str) -> bool:
+    return bool(_POSTCODE_RE.fullmatch(postcode.upper().strip()))
+
+def _parse_ymd(date_string: str) -> date:
+    """Parse a YYYY-MM-DD string; raises ValueError if it isn't one."""
+    # fromisoformat also takes forms like 20240101 and 2024-W01-1, so pin the
+    # extended calendar date layout before handing it over
+    if len(date_string) != 10 or date_string[4] != '-' or date_string[7] != '-':
+        raise ValueError(f'Invalid date: {date_string!r}')
+    return date.fromisoformat(date_string)
 
 def validate_date_string(date_string: str, format: str = '%Y-%m-%d') -> bool:
     """Validate date string format."""
@@ -78,7 +153,10 @@ def validate_date_string(date_string: str, format: str = '%Y-%m-%d') -> bool:
         return False
     
     try:
-        datetime.strptime(date_string, format)
+        if format == '%Y-%m-%d':
+            _parse_ymd(date_string)
+        else:
+            datetime.strptime(date_string, format)
         return True
     except ValueError:
         return False
@@ -89,201 +167,236 @@ def validate_datetime_string(datetime_string: str) -> bool:
         return False
     
     try:
-        datetime.fromisoformat(datetime_string.replace('Z', '+00:00'))
+        datetime.fromisoformat(datetime_string)
         return True
     except ValueError:
         return False
 
-def validate_appointment_time(appointment_datetime: str) -> Dict[str, Any]:
+class ValidationResult(NamedTuple):
+    """Outcome of a record validator; errors is a list or a dict keyed by field."""
+    valid: bool
+    errors: Union[List[str], Dict[str, Any]]
+
+def validate_appointment_time(appointment_datetime: str) -> ValidationResult:
     """
     Validate appointment datetime with NHS-specific rules.
     Returns validation result with details.
     """
-    result = {
-        'valid': False,
-        'errors': []
-    }
-    
-    if not validate_datetime_string(appointment_datetime):
-        result['errors'].append('Invalid datetime format')
-        return result
+    errors = []
     
+    # Parse once; fromisoformat accepts a trailing 'Z' from Python 3.11
     try:
-        appt_time = datetime.fromisoformat(appointment_datetime.replace('Z', '+00:00'))
-        now = datetime.now(timezone.utc)
-        
-        # Must be in the future
-        if appt_time <= now:
-            result['errors'].append('Appointment must be in the future')
-        
-        # Must be within reasonable booking window (e.g., 6 months)
-        max_advance_days = 180
-        if (appt_time - now).days > max_advance_days:
-            result['errors'].append(f'Appointment cannot be more than {max_advance_days} days in advance')
-        
-        # Check if it's during typical GP hours (8 AM - 6 PM, Monday-Friday)
-        if appt_time.weekday() >= 5:  # Saturday or Sunday
-            result['errors'].append('Appointments are typically not available on weekends')
-        
-        hour = appt_time.hour
-        if hour < 8 or hour >= 18:
-            result['errors'].append('Appointments are typically available between 8 AM and 6 PM')
-        
-        # Must be on the hour or half-hour
-        if appt_time.minute not in [0, 30]:
-            result['errors'].append('Appointments must be scheduled on the hour or half-hour')
-        
-        result['valid'] = len(result['errors']) == 0
-        
-    except Exception as e:
-        result['errors'].append(f'Error validating appointment time: {str(e)}')
+        appt_time = datetime.fromisoformat(appointment_datetime)
+    except (TypeError, ValueError):
+        errors.append('Invalid datetime format')
+        return ValidationResult(False, errors)
+    
+    # Naive values are taken as UTC, as the Appointment model does
+    if appt_time.tzinfo is None:
+        appt_time = appt_time.replace(tzinfo=timezone.utc)
     
-    return result
+    # Compare POSIX timestamps rather than building a timedelta
+    seconds_ahead = appt_time.timestamp() - time.time()
+    
+    # Must be in the future
+    if seconds_ahead <= 0:
+        errors.append('Appointment must be in the future')
+    
+    # Must be within reasonable booking window (e.g., 6 months); a part day
+    # past the limit is allowed, as with timedelta.days
+    max_advance_days = 180
+    if seconds_ahead >= (max_advance_days + 1) * 86400:
+        errors.append(f'Appointment cannot be more than {max_advance_days} days in advance')
+    
+    # Check if it's during typical GP hours (8 AM - 6 PM, Monday-Friday)
+    if appt_time.weekday() >= 5:  # Saturday or Sunday
+        errors.append('Appointments are typically not available on weekends')
+    
+    hour = appt_time.hour
+    if hour < 8 or hour >= 18:
+        errors.append('Appointments are typically available between 8 AM and 6 PM')
+    
+    # Must be on the hour or half-hour
+    if appt_time.minute not in [0, 30]:
+        errors.append('Appointments must be scheduled on the hour or half-hour')
+    
+    return ValidationResult(not errors, errors)
 
-def validate_patient_data(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Validate patient registration/update data."""
-    result = {
-        'valid': False,
-        'errors': {}
-    }
+def validate_patient_data(data: Dict[str, Any], partial: bool = False) -> ValidationResult:
+    """
+    Validate patient registration/update data.
+    With partial=True only the fields present are checked, for updates.
+    """
+    if not isinstance(data, dict):
+        return ValidationResult(False, {'body': _INVALID_PAYLOAD_ERROR})
+    
+    errors = {}
     
-    required_fields = ['first_name', 'last_name', 'date_of_birth', 'email']
+    required_fields = _REQUIRED_PATIENT_FIELDS
+    if partial:
+        required_fields = [field for field in required_fields if field in data]
     
     # Check required fields
     for field in required_fields:
-        if field not in data or not data[field]:
-            result['errors'][field] = 'This field is required'
+        if not data.get(field):
+            errors[field] = 'This field is required'
     
     # Validate email
-    if 'email' in data and data['email']:
-        if not validate_email(data['email']):
-            result['errors']['email'] = 'Invalid email format'
+    email = data.get('email')
+    if email and not validate_email(email):
+        errors['email'] = 'Invalid email format'
     
     # Validate NHS number if provided
-    if 'nhs_number' in data and data['nhs_number']:
-        if not validate_nhs_number(data['nhs_number']):
-            result['errors']['nhs_number'] = 'Invalid NHS number format'
+    nhs_number = data.get('nhs_number')
+    if nhs_number and not validate_nhs_number(nhs_number):
+        errors['nhs_number'] = 'Invalid NHS number format'
     
     # Validate phone number if provided
-    if 'phone' in data and data['phone']:
-        if not validate_phone_number(data['phone']):
-            result['errors']['phone'] = 'Invalid UK phone number format'
+    phone = data.get('phone')
+    if phone and not validate_phone_number(phone):
+        errors['phone'] = 'Invalid UK phone number format'
     
     # Validate postcode if provided
-    if 'postcode' in data and data['postcode']:
-        if not validate_postcode(data['postcode']):
-            result['errors']['postcode'] = 'Invalid UK postcode format'
+    postcode = data.get('postcode')
+    if postcode and not validate_postcode(postcode):
+        errors['postcode'] = 'Invalid UK postcode format'
     
     # Validate date of birth
-    if 'date_of_birth' in data and data['date_of_birth']:
-        if not validate_date_string(data['date_of_birth']):
-            result['errors']['date_of_birth'] = 'Invalid date format (YYYY-MM-DD expected)'
+    date_of_birth = data.get('date_of_birth')
+    if date_of_birth:
+        try:
+            dob = _parse_ymd(date_of_birth)
+        except (TypeError, ValueError):
+            errors['date_of_birth'] = 'Invalid date format (YYYY-MM-DD expected)'
         else:
-            try:
-                dob = datetime.strptime(data['date_of_birth'], '%Y-%m-%d').date()
-                today = date.today()
-                age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-                
-                if age < 0:
-                    result['errors']['date_of_birth'] = 'Date of birth cannot be in the future'
-                elif age > 150:
-                    result['errors']['date_of_birth'] = 'Invalid date of birth'
-            except ValueError:
-                result['errors']['date_of_birth'] = 'Invalid date format'
+            today = date.today()
+            age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+            
+            if age < 0:
+                errors['date_of_birth'] = 'Date of birth cannot be in the future'
+            elif age > 150:
+                errors['date_of_birth'] = 'Invalid date of birth'
     
     # Validate medical information if provided
-    if 'medical_info' in data and data['medical_info']:
-        medical_validation = validate_medical_info(data['medical_info'])
-        if not medical_validation['valid']:
-            result['errors']['medical_info'] = medical_validation['errors']
+    medical_info = data.get('medical_info')
+    if medical_info:
+        medical_validation = validate_medical_info(medical_info)
+        if not medical_validation.valid:
+            errors['medical_info'] = medical_validation.errors
     
-    result['valid'] = len(result['errors']) == 0
-    return result
+    return ValidationResult(not errors, errors)
 
-def validate_appointment_data(data: Dict[str, Any]) -> Dict[str, Any]:
+def validate_appointment_data(data: Dict[str, Any]) -> ValidationResult:
     """Validate appointment booking data."""
-    result = {
-        'valid': False,
-        'errors': {}
-    }
+    if not isinstance(data, dict):
+        return ValidationResult(False, {'body': _INVALID_PAYLOAD_ERROR})
     
-    required_fields = ['patient_id', 'practice_id', 'appointment_datetime', 'appointment_type']
+    errors = {}
     
     # Check required fields
-    for field in required_fields:
-        if field not in data or not data[field]:
-            result['errors'][field] = 'This field is required'
+    for field in _REQUIRED_APPOINTMENT_FIELDS:
+        if not data.get(field):
+            errors[field] = 'This field is required'
     
     # Validate appointment datetime
-    if 'appointment_datetime' in data and data['appointment_datetime']:
-        time_validation = validate_appointment_time(data['appointment_datetime'])
-        if not time_validation['valid']:
-            result['errors']['appointment_datetime'] = time_validation['errors']
-    
-    # Validate appointment type
-    valid_types = ['routine', 'urgent', 'follow_up', 'consultation', 'vaccination']
-    if 'appointment_type' in data and data['appointment_type']:
-        if data['appointment_type'] not in valid_types:
-            result['errors']['appointment_type'] = f'Must be one of: {", ".join(valid_types)}'
+    appointment_datetime = data.get('appointment_datetime')
+    if appointment_datetime:
+        time_validation = validate_appointment_time(appointment_datetime)
+        if not time_validation.valid:
+            errors['appointment_datetime'] = time_validation.errors
+    
+    # Validate appointment type; type check first, as an unhashable value can't be looked up
+    appointment_type = data.get('appointment_type')
+    if appointment_type:
+        if not isinstance(appointment_type, str) or appointment_type not in _APPOINTMENT_TYPES:
+            errors['appointment_type'] = _APPOINTMENT_TYPE_ERROR
     
     # Validate duration if provided
-    if 'duration_minutes' in data and data['duration_minutes']:
+    duration_minutes = data.get('duration_minutes')
+    if duration_minutes:
         try:
-            duration = int(data['duration_minutes'])
+            duration = int(duration_minutes)
             if duration < 5 or duration > 120:
-                result['errors']['duration_minutes'] = 'Duration must be between 5 and 120 minutes'
+                errors['duration_minutes'] = 'Duration must be between 5 and 120 minutes'
         except (ValueError, TypeError):
-            result['errors']['duration_minutes'] = 'Duration must be a number'
+            errors['duration_minutes'] = 'Duration must be a number'
     
-    result['valid'] = len(result['errors']) == 0
-    return result
+    return ValidationResult(not errors, errors)
 
-def validate_medical_info(medical_info: Dict[str, Any]) -> Dict[str, Any]:
+def validate_medical_info(medical_info: Dict[str, Any]) -> ValidationResult:
     """
-    Validate medical information with dual storage format support.
+    Validate medical information; items may be coded dicts or plain strings.
     """
-    result = {
-        'valid': True,
-        'errors': {}
-    }
-    
-    # Validate allergies
-    if 'allergies' in medical_info:
-        allergy_errors = validate_medical_items(
-            medical_info['allergies'], 
-            'allergy',
-            ['severity', 'reaction', 'onset_date']
-        )
-        if allergy_errors:
-            result['errors']['allergies'] = allergy_errors
-    
-    # Validate conditions
-    if 'conditions' in medical_info:
-        condition_errors = validate_medical_items(
-            medical_info['conditions'],
-            'condition', 
-            ['clinical_status', 'onset_date', 'resolved_date']
-        )
-        if condition_errors:
-            result['errors']['conditions'] = condition_errors
-    
-    # Validate medications
-    if 'medications' in medical_info:
-        medication_errors = validate_medical_items(
-            medical_info['medications'],
-            'medication',
-            ['dosage', 'frequency', 'route', 'start_date', 'end_date', 'prescriber']
-        )
-        if medication_errors:
-            result['errors']['medications'] = medication_errors
+    errors = {}
+    
+    for key, item_type, optional_fields in _MEDICAL_LISTS:
+        if key in medical_info:
+            item_errors = validate_medical_items(medical_info[key], item_type, optional_fields)
+            if item_errors:
+                errors[key] = item_errors
+        
+        # The older *_legacy lists are lifted into coded items as-is, so they must hold strings
+        legacy_key = f'{key}_legacy'
+        if legacy_key in medical_info:
+            legacy_errors = validate_legacy_items(medical_info[legacy_key], item_type)
+            if legacy_errors:
+                errors[legacy_key] = legacy_errors
     
     # Validate notes length
     if 'notes' in medical_info and medical_info['notes']:
         if len(medical_info['notes']) > 2000:
-            result['errors']['notes'] = 'Notes cannot exceed 2000 characters'
+            errors['notes'] = 'Notes cannot exceed 2000 characters'
+    
+    return ValidationResult(not errors, errors)
+
+def _coded_item_errors(item: Dict[str, Any]) -> Dict[str, str]:
+    """Checks shared by every coded medical item, whatever its type."""
+    item_errors = {}
+    
+    # Validate required display_text
+    display_text = item.get('display_text')
+    if not display_text:
+        item_errors['display_text'] = 'Display text is required'
+    elif len(display_text) > 200:
+        item_errors['display_text'] = 'Display text cannot exceed 200 characters'
+    
+    # Validate optional code fields
+    code = item.get('code')
+    if code and len(code) > 50:
+        item_errors['code'] = 'Code cannot exceed 50 characters'
+    
+    system = item.get('system')
+    if system and len(system) > 100:
+        item_errors['system'] = 'System URI cannot exceed 100 characters'
+    
+    # Validate dates if present
+    for date_field in _MEDICAL_DATE_FIELDS:
+        value = item.get(date_field)
+        if value and not validate_date_string(value):
+            item_errors[date_field] = 'Invalid date format (YYYY-MM-DD expected)'
+    
+    return item_errors
+
+def validate_legacy_items(items: list, item_type: str) -> list:
+    """
+    Validate an older *_legacy list, which may only contain plain strings.
+    """
+    if not isinstance(items, list):
+        return [f'{item_type.capitalize()} legacy entries must be a list']
     
-    result['valid'] = len(result['errors']) == 0
-    return result
+    errors = []
+    for i, item in enumerate(items):
+        if not isinstance(item, str):
+            item_errors = {'format': f'{item_type.capitalize()} legacy entries must be strings'}
+        elif not item.strip():
+            item_errors = {'display_text': 'Cannot be empty'}
+        elif len(item) > 200:
+            item_errors = {'display_text': 'Display text cannot exceed 200 characters'}
+        else:
+            continue
+        errors.append({f'{item_type}_legacy_{i}': item_errors})
+    
+    return errors
 
 def validate_medical_items(items: list, item_type: str, optional_fields: list) -> list:
     """
@@ -294,52 +407,29 @@ def validate_medical_items(items: list, item_type: str, optional_fields: list) -
     if not isinstance(items, list):
         return [f'{item_type.capitalize()} must be a list']
     
+    # Resolve the type-specific check once rather than comparing item_type per item
+    enum_field, enum_values, enum_error = _MEDICAL_ENUM_FIELDS.get(item_type, (None, None, None))
+    
     for i, item in enumerate(items):
-        item_errors = {}
-        
         # Handle legacy string format
         if isinstance(item, str):
-            if not item.strip():
-                item_errors['display_text'] = 'Cannot be empty'
+            item_errors = {} if item.strip() else {'display_text': 'Cannot be empty'}
         # Handle new coded format
         elif isinstance(item, dict):
-            # Validate required display_text
-            if 'display_text' not in item or not item['display_text']:
-                item_errors['display_text'] = 'Display text is required'
-            elif len(item['display_text']) > 200:
-                item_errors['display_text'] = 'Display text cannot exceed 200 characters'
-            
-            # Validate optional code fields
-            if 'code' in item and item['code']:
-                if len(item['code']) > 50:
-                    item_errors['code'] = 'Code cannot exceed 50 characters'
-            
-            if 'system' in item and item['system']:
-                if len(item['system']) > 100:
-                    item_errors['system'] = 'System URI cannot exceed 100 characters'
-            
-            # Validate dates if present
-            date_fields = ['onset_date', 'resolved_date', 'start_date', 'end_date']
-            for date_field in date_fields:
-                if date_field in item and item[date_field]:
-                    if not validate_date_string(item[date_field]):
-                        item_errors[date_field] = 'Invalid date format (YYYY-MM-DD expected)'
-            
-            # Validate severity for allergies
-            if item_type == 'allergy' and 'severity' in item and item['severity']:
-                valid_severities = ['mild', 'moderate', 'severe', 'life-threatening']
-                if item['severity'] not in valid_severities:
-                    item_errors['severity'] = f'Severity must be one of: {", ".join(valid_severities)}'
-            
-            # Validate clinical status for conditions
-            if item_type == 'condition' and 'clinical_status' in item and item['clinical_status']:
-                valid_statuses = ['active', 'resolved', 'inactive']
-                if item['clinical_status'] not in valid_statuses:
-                    item_errors['clinical_status'] = f'Clinical status must be one of: {", ".join(valid_statuses)}'
+            item_errors = _coded_item_errors(item)
+            if enum_field:
+                value = item.get(enum_field)
+                # Type check first: an unhashable value can't be looked up in the set
+                if value and (not isinstance(value, str) or value not in enum_values):
+                    item_errors[enum_field] = enum_error
         else:
-            item_errors['format'] = f'{item_type.capitalize()} must be a string or object'
+            item_errors = {'format': f'{item_type.capitalize()} must be a string or object'}
         
         if item_errors:
-            errors.append({f'{item_type}_{i}': item_errors})
+            errors.append((i, item_errors))
     
-    return errors
+    # Keys are only formatted for the items that actually failed
+    if not errors:
+        return errors
+    prefix = f'{item_type}_'
+    return [{f'{prefix}{i}': item_errors} for i, item_errors in errors]
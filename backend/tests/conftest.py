@@ -5,7 +5,8 @@ Pytest configuration and fixtures for backend tests.
 import os
 import sys
 import pytest
-from unittest.mock import MagicMock
+from types import MappingProxyType
+from moto import mock_aws
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -23,47 +24,83 @@ os.environ['AWS_SECRET_ACCESS_KEY'] = 'test'
 
 
 @pytest.fixture
-def mock_db():
-    """Mock database manager."""
-    db = MagicMock()
-    db.create_item = MagicMock(return_value=True)
-    db.get_item = MagicMock(return_value=None)
-    db.query_items = MagicMock(return_value=[])
-    db.update_item = MagicMock(return_value=True)
-    db.delete_item = MagicMock(return_value=True)
-    return db
+def moto_db(monkeypatch):
+    """
+    DatabaseManager backed by moto's in-memory DynamoDB, with the patients
+    (NHS number and email indexes) and practices tables created.
+    """
+    # moto only intercepts AWS endpoints, not the DynamoDB Local one
+    monkeypatch.delenv('DYNAMODB_ENDPOINT')
+    
+    with mock_aws():
+        from utils.database import DatabaseManager
+        manager = DatabaseManager()
+        
+        manager.dynamodb.create_table(
+            TableName=os.environ['PATIENTS_TABLE'],
+            KeySchema=[{'AttributeName': 'patient_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'patient_id', 'AttributeType': 'S'},
+                {'AttributeName': 'nhs_number', 'AttributeType': 'S'},
+                {'AttributeName': 'email', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    'IndexName': index_name,
+                    'KeySchema': [{'AttributeName': attribute, 'KeyType': 'HASH'}],
+                    'Projection': {'ProjectionType': 'ALL'}
+                }
+                for index_name, attribute in (('NHSNumberIndex', 'nhs_number'), ('EmailIndex', 'email'))
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        manager.dynamodb.create_table(
+            TableName=os.environ['PRACTICES_TABLE'],
+            KeySchema=[{'AttributeName': 'practice_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'practice_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        
+        yield manager
 
 
-@pytest.fixture
+# Read-only so session-scoped fixtures can't leak edits between tests;
+# a test that needs to change one should take its own dict() copy
+_SAMPLE_PATIENT = MappingProxyType({
+    'patient_id': 'test-patient-123',
+    'email': 'test@example.com',
+    'password': 'TestPass123!',
+    'nhs_number': '9434765919',
+    'first_name': 'Test',
+    'last_name': 'User',
+    'date_of_birth': '1990-01-01',
+    'phone': '07123456789',
+    'user_type': 'patient',
+    'status': 'active'
+})
+
+_SAMPLE_APPOINTMENT = MappingProxyType({
+    'appointment_id': 'test-appt-123',
+    'patient_id': 'test-patient-123',
+    'practice_id': 'test-practice-123',
+    'appointment_type': 'gp_consultation',
+    'appointment_date': '2024-12-01',
+    'appointment_time': '10:00',
+    'status': 'scheduled',
+    'reason': 'Annual checkup'
+})
+
+
+@pytest.fixture(scope='session')
 def sample_patient():
     """Sample patient data for testing."""
-    return {
-        'patient_id': 'test-patient-123',
-        'email': 'test@example.com',
-        'password': 'TestPass123!',
-        'nhs_number': '9434765919',
-        'first_name': 'Test',
-        'last_name': 'User',
-        'date_of_birth': '1990-01-01',
-        'phone': '07123456789',
-        'user_type': 'patient',
-        'status': 'active'
-    }
+    return _SAMPLE_PATIENT
 
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def sample_appointment():
     """Sample appointment data for testing."""
-    return {
-        'appointment_id': 'test-appt-123',
-        'patient_id': 'test-patient-123',
-        'practice_id': 'test-practice-123',
-        'appointment_type': 'gp_consultation',
-        'appointment_date': '2024-12-01',
-        'appointment_time': '10:00',
-        'status': 'scheduled',
-        'reason': 'Annual checkup'
-    }
+    return _SAMPLE_APPOINTMENT
 
 
 @pytest.fixture
@@ -5,9 +5,8 @@ Tests for appointment functions.
 import pytest
 import json
 from unittest.mock import patch, MagicMock
-import sys
-import os
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from appointments import create_appointment, get_appointments, update_appointment, delete_appointment
 
 
 class TestCreateAppointment:
@@ -16,7 +15,6 @@ class TestCreateAppointment:
     @patch('appointments.create_appointment.db')
     def test_create_appointment_success(self, mock_db, lambda_event):
         """Test successful appointment creation."""
-        from appointments.create_appointment import lambda_handler
         
         mock_db.create_item.return_value = True
         mock_db.get_item.return_value = {'practice_id': 'test-practice'}
@@ -34,7 +32,7 @@ class TestCreateAppointment:
             })
         )
         
-        response = lambda_handler(event, None)
+        response = create_appointment.lambda_handler(event, None)
         
         assert response['statusCode'] == 201
         body = json.loads(response['body'])
@@ -42,7 +40,6 @@ class TestCreateAppointment:
     
     def test_create_appointment_missing_fields(self, lambda_event):
         """Test appointment creation with missing required fields."""
-        from appointments.create_appointment import lambda_handler
         
         event = lambda_event(
             method='POST',
@@ -53,7 +50,7 @@ class TestCreateAppointment:
             })
         )
         
-        response = lambda_handler(event, None)
+        response = create_appointment.lambda_handler(event, None)
         
         assert response['statusCode'] == 400
 
@@ -64,7 +61,6 @@ class TestGetAppointments:
     @patch('appointments.get_appointments.db')
     def test_get_appointments_by_patient(self, mock_db, lambda_event, sample_appointment):
         """Test getting appointments for a patient."""
-        from appointments.get_appointments import lambda_handler
         
         mock_db.query_items.return_value = [sample_appointment]
         
@@ -74,7 +70,7 @@ class TestGetAppointments:
         )
         event['queryStringParameters'] = {'patient_id': 'test-patient-123'}
         
-        response = lambda_handler(event, None)
+        response = get_appointments.lambda_handler(event, None)
         
         assert response['statusCode'] == 200
         body = json.loads(response['body'])
@@ -88,7 +84,6 @@ class TestUpdateAppointment:
     @patch('appointments.update_appointment.db')
     def test_update_appointment_success(self, mock_db, lambda_event, sample_appointment):
         """Test successful appointment update."""
-        from appointments.update_appointment import lambda_handler
         
         mock_db.get_item.return_value = sample_appointment
         mock_db.update_item.return_value = {**sample_appointment, 'status': 'cancelled'}
@@ -102,14 +97,13 @@ class TestUpdateAppointment:
         )
         event['pathParameters'] = {'appointment_id': 'test-appt-123'}
         
-        response = lambda_handler(event, None)
+        response = update_appointment.lambda_handler(event, None)
         
         assert response['statusCode'] == 200
     
     @patch('appointments.update_appointment.db')
     def test_update_nonexistent_appointment(self, mock_db, lambda_event):
         """Test updating non-existent appointment."""
-        from appointments.update_appointment import lambda_handler
         
         mock_db.get_item.return_value = None
         
@@ -120,7 +114,7 @@ class TestUpdateAppointment:
         )
         event['pathParameters'] = {'appointment_id': 'nonexistent'}
         
-        response = lambda_handler(event, None)
+        response = update_appointment.lambda_handler(event, None)
         
         assert response['statusCode'] == 404
 
@@ -131,7 +125,6 @@ class TestDeleteAppointment:
     @patch('appointments.delete_appointment.db')
     def test_delete_appointment_success(self, mock_db, lambda_event, sample_appointment):
         """Test successful appointment deletion."""
-        from appointments.delete_appointment import lambda_handler
         
         mock_db.get_item.return_value = sample_appointment
         mock_db.update_item.return_value = True
@@ -142,6 +135,6 @@ class TestDeleteAppointment:
         )
         event['pathParameters'] = {'appointment_id': 'test-appt-123'}
         
-        response = lambda_handler(event, None)
+        response = delete_appointment.lambda_handler(event, None)
         
         assert response['statusCode'] == 200
@@ -4,10 +4,67 @@ Tests for authentication functions.
 
 import pytest
 import json
+import time
 from unittest.mock import patch, MagicMock
-import sys
-import os
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from auth import auth
+from utils import auth as auth_utils
+from utils.database import uniqueness_sentinel
+
+_REGION = 'eu-west-2'
+_USER_POOL_ID = 'eu-west-2_testpool'
+_CLIENT_ID = 'test-client-id'
+_ISSUER = f'https://cognito-idp.{_REGION}.amazonaws.com/{_USER_POOL_ID}'
+
+
+@pytest.fixture(scope='module')
+def signing_key():
+    """RSA key pair standing in for a Cognito user pool key."""
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def jwks_response(signing_key):
+    """Build a urllib3-style response serving the signing key as a JWKS."""
+    def _response(status=200, kid='kid1'):
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(signing_key.public_key()))
+        jwk.update({'kid': kid, 'alg': 'RS256', 'use': 'sig'})
+        return MagicMock(status=status, data=json.dumps({'keys': [jwk]}).encode())
+    return _response
+
+
+@pytest.fixture
+def make_token(signing_key):
+    """Sign a token like Cognito's, with claims and headers overridable per test."""
+    def _token(key=signing_key, algorithm='RS256', kid='kid1', **claims):
+        now = int(time.time())
+        payload = {
+            'sub': 'test-user-123',
+            'email': 'test@example.com',
+            'custom:role': 'patient',
+            'aud': _CLIENT_ID,
+            'iss': _ISSUER,
+            'iat': now,
+            'exp': now + 3600
+        }
+        payload.update(claims)
+        return jwt.encode(payload, key, algorithm=algorithm, headers={'kid': kid} if kid else None)
+    return _token
+
+
+@pytest.fixture
+def auth_manager(monkeypatch):
+    """AuthManager for a test user pool, with the module-level caches emptied."""
+    for cache_name in ('_JWKS_CACHE', '_KEYS_CACHE', '_KEYS_LOADED_AT', '_TOKEN_CACHE'):
+        monkeypatch.setattr(auth_utils, cache_name, type(getattr(auth_utils, cache_name))())
+    manager = auth_utils.AuthManager()
+    manager.user_pool_id = _USER_POOL_ID
+    manager.client_id = _CLIENT_ID
+    manager.region = _REGION
+    return manager
 
 
 class TestLogin:
@@ -16,7 +73,6 @@ class TestLogin:
     @patch('auth.auth.db')
     def test_login_success(self, mock_db, lambda_event, sample_patient):
         """Test successful login."""
-        from auth.auth import handle_login
         
         # Mock database response
         mock_db.query_items.return_value = [sample_patient]
@@ -30,7 +86,7 @@ class TestLogin:
             })
         )
         
-        response = handle_login(event)
+        response = auth.handle_login(event)
         
         assert response['statusCode'] == 200
         body = json.loads(response['body'])
@@ -40,7 +96,6 @@ class TestLogin:
     @patch('auth.auth.db')
     def test_login_invalid_credentials(self, mock_db, lambda_event):
         """Test login with invalid credentials."""
-        from auth.auth import handle_login
         
         # Mock no user found
         mock_db.query_items.return_value = []
@@ -54,13 +109,12 @@ class TestLogin:
             })
         )
         
-        response = handle_login(event)
+        response = auth.handle_login(event)
         
         assert response['statusCode'] == 401
     
     def test_login_missing_fields(self, lambda_event):
         """Test login with missing fields."""
-        from auth.auth import handle_login
         
         event = lambda_event(
             method='POST',
@@ -68,7 +122,7 @@ class TestLogin:
             body=json.dumps({'email': 'test@example.com'})
         )
         
-        response = handle_login(event)
+        response = auth.handle_login(event)
         
         assert response['statusCode'] == 400
 
@@ -79,7 +133,6 @@ class TestRegistration:
     @patch('auth.auth.db')
     def test_register_success(self, mock_db, lambda_event):
         """Test successful registration."""
-        from auth.auth import handle_register
         
         # Mock no existing user
         mock_db.query_items.return_value = []
@@ -100,7 +153,7 @@ class TestRegistration:
             })
         )
         
-        response = handle_register(event)
+        response = auth.handle_register(event)
         
         assert response['statusCode'] == 201
         body = json.loads(response['body'])
@@ -110,7 +163,6 @@ class TestRegistration:
     @patch('auth.auth.db')
     def test_register_duplicate_email(self, mock_db, lambda_event, sample_patient):
         """Test registration with existing email."""
-        from auth.auth import handle_register
         
         # Mock existing user
         mock_db.query_items.return_value = [sample_patient]
@@ -128,13 +180,52 @@ class TestRegistration:
             })
         )
         
-        response = handle_register(event)
+        response = auth.handle_register(event)
         
         assert response['statusCode'] == 400
     
+    def test_register_reserves_email_and_nhs_number(self, moto_db, lambda_event):
+        """Test that registration reserves the email and NHS number in the same write."""
+        
+        def register(email, nhs_number):
+            return auth.handle_register(lambda_event(
+                method='POST',
+                path='/auth/register',
+                body=json.dumps({
+                    'email': email,
+                    'password': 'TestPass123!',
+                    'nhs_number': nhs_number,
+                    'role': 'patient'
+                })
+            ))
+        
+        with patch('auth.auth.db', moto_db):
+            response = register('newuser@example.com', '9434765919')
+            assert response['statusCode'] == 201
+            user_id = json.loads(response['body'])['data']['user_id']
+            
+            sentinel = moto_db.get_item('patients', {'patient_id': 'UNIQ#EMAIL#newuser@example.com'})
+            assert sentinel['owner_patient_id'] == user_id
+            sentinel = moto_db.get_item('patients', {'patient_id': 'UNIQ#NHS#9434765919'})
+            assert sentinel['owner_patient_id'] == user_id
+            
+            # A registration racing past the email lookup still hits the sentinel
+            moto_db.transact_write_items([
+                uniqueness_sentinel('EMAIL#racer@example.com', 'other-patient', '2024-01-01T00:00:00')
+            ])
+            response = register('racer@example.com', '4010232137')
+            assert response['statusCode'] == 400
+            assert json.loads(response['body'])['error'] == 'User with this email already exists'
+            
+            response = register('other@example.com', '9434765919')
+            assert response['statusCode'] == 400
+            assert json.loads(response['body'])['error'] == 'User with this NHS number already exists'
+            
+            # Only the first registration made it in
+            assert [patient['patient_id'] for patient in moto_db.scan_items('patients')] == [user_id]
+    
     def test_register_invalid_email(self, lambda_event):
         """Test registration with invalid email."""
-        from auth.auth import handle_register
         
         event = lambda_event(
             method='POST',
@@ -146,13 +237,12 @@ class TestRegistration:
             })
         )
         
-        response = handle_register(event)
+        response = auth.handle_register(event)
         
         assert response['statusCode'] == 400
     
     def test_register_invalid_nhs_number(self, lambda_event):
         """Test registration with invalid NHS number."""
-        from auth.auth import handle_register
         
         event = lambda_event(
             method='POST',
@@ -165,6 +255,231 @@ class TestRegistration:
             })
         )
         
-        response = handle_register(event)
+        response = auth.handle_register(event)
         
         assert response['statusCode'] == 400
+
+
+class TestJWKS:
+    """Test signing key lookup from the user pool JWKS."""
+    
+    def test_signing_key_recovers_after_failed_fetch(self, auth_manager, jwks_response):
+        """Test that a failed JWKS fetch isn't cached, so the next lookup retries."""
+        
+        with patch.object(auth_utils, '_HTTP') as mock_http:
+            mock_http.request.side_effect = [jwks_response(status=503), jwks_response()]
+            
+            assert auth_manager.get_signing_key('kid1') is None
+            assert auth_utils._KEYS_CACHE == {}
+            
+            assert auth_manager.get_signing_key('kid1') is not None
+            assert mock_http.request.call_count == 2
+    
+    def test_unknown_kid_refetch_is_throttled(self, auth_manager, jwks_response):
+        """Test that an unknown kid only triggers a refetch once the refresh interval has passed."""
+        
+        with patch.object(auth_utils, '_HTTP') as mock_http:
+            mock_http.request.side_effect = [jwks_response(), jwks_response(kid='kid2')]
+            
+            assert auth_manager.get_signing_key('kid1') is not None
+            assert auth_manager.get_signing_key('kid2') is None
+            assert mock_http.request.call_count == 1
+            
+            auth_utils._KEYS_LOADED_AT[_USER_POOL_ID] -= auth_utils._JWKS_REFRESH_INTERVAL
+            assert auth_manager.get_signing_key('kid2') is not None
+            assert mock_http.request.call_count == 2
+
+
+class TestTokenValidation:
+    """Test JWT signature and claim checks."""
+    
+    @pytest.fixture(autouse=True)
+    def serve_jwks(self, jwks_response):
+        with patch.object(auth_utils, '_HTTP') as mock_http:
+            mock_http.request.return_value = jwks_response()
+            yield
+    
+    def test_valid_token(self, auth_manager, make_token):
+        """Test that a correctly signed token with valid claims is accepted."""
+        
+        payload = auth_manager.validate_token(make_token())
+        
+        assert payload['sub'] == 'test-user-123'
+        assert payload['aud'] == _CLIENT_ID
+    
+    def test_audience_list(self, auth_manager, make_token):
+        """Test that a list audience containing the client id is accepted."""
+        
+        assert auth_manager.validate_token(make_token(aud=['other-client', _CLIENT_ID]))
+    
+    def test_tampered_signature(self, auth_manager, make_token):
+        """Test that a payload swapped under another token's signature is rejected."""
+        
+        header, _, signature = make_token().split('.')
+        _, payload, _ = make_token(**{'custom:role': 'admin'}).split('.')
+        
+        assert auth_manager.validate_token(f'{header}.{payload}.{signature}') is None
+    
+    def test_signed_with_other_key(self, auth_manager, make_token):
+        """Test that a token signed by a key outside the JWKS is rejected."""
+        
+        other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        
+        assert auth_manager.validate_token(make_token(key=other_key)) is None
+    
+    @pytest.mark.parametrize('algorithm,key', [
+        ('HS256', 'a-shared-secret-at-least-32-bytes-long'),
+        ('none', None),
+    ])
+    def test_wrong_algorithm(self, auth_manager, make_token, algorithm, key):
+        """Test that only RS256 tokens are accepted."""
+        
+        token = make_token(key=key, algorithm=algorithm)
+        
+        assert auth_manager.validate_token(token) is None
+    
+    @pytest.mark.parametrize('kid', [None, 'unknown-kid'])
+    def test_missing_or_unknown_kid(self, auth_manager, make_token, kid):
+        """Test that a token whose kid isn't in the JWKS is rejected."""
+        
+        assert auth_manager.validate_token(make_token(kid=kid)) is None
+    
+    def test_expired_token(self, auth_manager, make_token):
+        """Test that an expired token is rejected."""
+        
+        assert auth_manager.validate_token(make_token(exp=int(time.time()) - 10)) is None
+    
+    def test_future_nbf(self, auth_manager, make_token):
+        """Test that a token used before its nbf is rejected."""
+        
+        assert auth_manager.validate_token(make_token(nbf=int(time.time()) + 600)) is None
+    
+    def test_bad_audience(self, auth_manager, make_token):
+        """Test that a token for another client is rejected."""
+        
+        assert auth_manager.validate_token(make_token(aud='other-client')) is None
+    
+    def test_bad_issuer(self, auth_manager, make_token):
+        """Test that a token from another user pool is rejected."""
+        
+        issuer = f'https://cognito-idp.{_REGION}.amazonaws.com/eu-west-2_otherpool'
+        
+        assert auth_manager.validate_token(make_token(iss=issuer)) is None
+    
+    @pytest.mark.parametrize('claims', [
+        {'exp': 'x'},
+        {'exp': None},
+        {'exp': True},
+        {'nbf': 'x'},
+        {'nbf': [0]},
+    ])
+    def test_non_numeric_time_claims(self, auth_manager, make_token, claims):
+        """Test that exp/nbf of the wrong type are rejected rather than raising."""
+        
+        assert auth_manager.validate_token(make_token(**claims)) is None
+    
+    def test_bad_claim_type_is_unauthorized(self, auth_manager, make_token):
+        """Test that require_auth answers a bad exp claim with 401, not 500."""
+        
+        handler = auth_utils.require_auth()(lambda event, context: {'statusCode': 200})
+        event = {'headers': {'Authorization': f"Bearer {make_token(exp='x')}"}}
+        
+        with patch.object(auth_utils, 'auth', auth_manager):
+            response = handler(event, None)
+        
+        assert response['statusCode'] == 401
+
+
+class TestTokenCache:
+    """Test caching of users from verified tokens."""
+    
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        """Controllable wall clock for the auth module."""
+        clock = MagicMock(return_value=1_000_000.0)
+        monkeypatch.setattr(auth_utils, 'time', MagicMock(time=clock, monotonic=time.monotonic))
+        return clock
+    
+    @pytest.fixture
+    def validate(self, auth_manager, clock):
+        """Stub validate_token, issuing a patient payload with a distinct sub per token."""
+        def _payload(token):
+            return {'sub': f'user-{token}', 'custom:role': 'patient', 'exp': clock() + 3600}
+        with patch.object(auth_manager, 'validate_token', side_effect=_payload) as mock_validate:
+            yield mock_validate
+    
+    def test_cache_hit_skips_validation(self, auth_manager, validate):
+        """Test that a reused token is served from the cache."""
+        
+        first = auth_manager.get_user_from_token('token-a')
+        second = auth_manager.get_user_from_token('token-a')
+        
+        assert first == second
+        assert first['user_id'] == 'user-token-a'
+        validate.assert_called_once_with('token-a')
+    
+    def test_entry_expires_at_token_exp(self, auth_manager, validate, clock):
+        """Test that a token expiring within the TTL is only cached until its exp."""
+        
+        validate.side_effect = lambda token: {'sub': 'user-1', 'exp': clock() + 30}
+        auth_manager.get_user_from_token('token-a')
+        
+        clock.return_value += 29
+        auth_manager.get_user_from_token('token-a')
+        assert validate.call_count == 1
+        
+        clock.return_value += 1
+        auth_manager.get_user_from_token('token-a')
+        assert validate.call_count == 2
+    
+    def test_entry_expires_after_ttl(self, auth_manager, validate, clock):
+        """Test that a long-lived token is only cached for the TTL."""
+        
+        auth_manager.get_user_from_token('token-a')
+        
+        clock.return_value += auth_utils._TOKEN_CACHE_TTL - 1
+        auth_manager.get_user_from_token('token-a')
+        assert validate.call_count == 1
+        
+        clock.return_value += 1
+        auth_manager.get_user_from_token('token-a')
+        assert validate.call_count == 2
+    
+    def test_least_recently_used_entry_is_evicted(self, auth_manager, validate, monkeypatch):
+        """Test that a full cache drops the least recently used token."""
+        
+        monkeypatch.setattr(auth_utils, '_TOKEN_CACHE_SIZE', 2)
+        auth_manager.get_user_from_token('token-a')
+        auth_manager.get_user_from_token('token-b')
+        # A hit refreshes token-a, leaving token-b the oldest
+        auth_manager.get_user_from_token('token-a')
+        auth_manager.get_user_from_token('token-c')
+        assert len(auth_utils._TOKEN_CACHE) == 2
+        validate.reset_mock()
+        
+        auth_manager.get_user_from_token('token-a')
+        auth_manager.get_user_from_token('token-c')
+        validate.assert_not_called()
+        
+        auth_manager.get_user_from_token('token-b')
+        validate.assert_called_once_with('token-b')
+    
+    def test_callers_get_a_copy(self, auth_manager, validate):
+        """Test that modifying a returned user leaves the cached one untouched."""
+        
+        auth_manager.get_user_from_token('token-a')['role'] = 'admin'
+        cached = auth_manager.get_user_from_token('token-a')
+        cached['role'] = 'admin'
+        
+        assert auth_manager.get_user_from_token('token-a')['role'] == 'patient'
+        validate.assert_called_once()
+    
+    def test_invalid_token_is_not_cached(self, auth_manager, validate):
+        """Test that a rejected token is validated again on every request."""
+        
+        validate.side_effect = lambda token: None
+        
+        assert auth_manager.get_user_from_token('token-a') is None
+        assert auth_manager.get_user_from_token('token-a') is None
+        assert validate.call_count == 2
+        assert len(auth_utils._TOKEN_CACHE) == 0
@@ -0,0 +1,80 @@
+"""
+Tests for the DynamoDB database manager.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+
+import utils.database as database
+
+
+class TestDatabaseManager:
+    """Test cases for DatabaseManager."""
+    
+    def test_resource_is_per_thread(self, moto_db):
+        """Test that each thread builds its own resource and reuses it."""
+        
+        assert moto_db.dynamodb is moto_db.dynamodb
+        assert moto_db.tables['patients'] is moto_db.tables['patients']
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            worker_dynamodb, worker_tables = executor.submit(
+                lambda: (moto_db.dynamodb, moto_db.tables)
+            ).result()
+        
+        assert worker_dynamodb is not moto_db.dynamodb
+        assert worker_tables['patients'] is not moto_db.tables['patients']
+        assert worker_tables['patients'].name == moto_db.tables['patients'].name
+    
+    def test_concurrent_reads_and_writes(self, moto_db):
+        """Test that operations from many threads at once all succeed."""
+        
+        def write_and_read(i):
+            moto_db.create_item('practices', {'practice_id': f'practice-{i}', 'name': f'Practice {i}'})
+            return moto_db.get_item('practices', {'practice_id': f'practice-{i}'})
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            items = list(executor.map(write_and_read, range(32)))
+        
+        assert [item['name'] for item in items] == [f'Practice {i}' for i in range(32)]
+    
+    def test_batch_get_retries_unprocessed_keys_with_backoff(self, moto_db):
+        """Test that unprocessed keys are retried after exponentially growing delays."""
+        
+        table_name = moto_db.tables['practices'].name
+        unprocessed = {table_name: {'Keys': [{'practice_id': 'practice-2'}]}}
+        # Swap in a stub resource once this thread's table handles exist
+        moto_db._local.dynamodb = MagicMock()
+        moto_db._local.dynamodb.batch_get_item.side_effect = [
+            {'Responses': {table_name: [{'practice_id': 'practice-1'}]}, 'UnprocessedKeys': unprocessed},
+            {'Responses': {}, 'UnprocessedKeys': unprocessed},
+            {'Responses': {table_name: [{'practice_id': 'practice-2'}]}, 'UnprocessedKeys': {}}
+        ]
+        
+        with patch.object(database.time, 'sleep') as mock_sleep:
+            results = moto_db.batch_get_items([
+                ('practices', {'practice_id': 'practice-1'}),
+                ('practices', {'practice_id': 'practice-2'})
+            ])
+        
+        assert results == {'practices': [{'practice_id': 'practice-1'}, {'practice_id': 'practice-2'}]}
+        base = database._BATCH_GET_BASE_DELAY
+        assert mock_sleep.call_args_list == [call(base), call(base * 2)]
+        assert moto_db._local.dynamodb.batch_get_item.call_args_list[1] == call(RequestItems=unprocessed)
+    
+    def test_batch_get_gives_up_after_max_retries(self, moto_db):
+        """Test that a table that never processes the keys doesn't spin forever."""
+        
+        table_name = moto_db.tables['practices'].name
+        unprocessed = {table_name: {'Keys': [{'practice_id': 'practice-1'}]}}
+        moto_db._local.dynamodb = MagicMock()
+        moto_db._local.dynamodb.batch_get_item.return_value = {'Responses': {}, 'UnprocessedKeys': unprocessed}
+        
+        with patch.object(database.time, 'sleep') as mock_sleep:
+            with pytest.raises(RuntimeError):
+                moto_db.batch_get_items([('practices', {'practice_id': 'practice-1'})])
+        
+        assert moto_db._local.dynamodb.batch_get_item.call_count == database._BATCH_GET_MAX_RETRIES + 1
+        assert mock_sleep.call_count == database._BATCH_GET_MAX_RETRIES
@@ -0,0 +1,129 @@
+"""
+Tests for data models.
+"""
+
+import pytest
+
+from utils.models import (
+    Appointment,
+    AppointmentStatus,
+    AppointmentType,
+    FHIRAppointment
+)
+
+
+def _internal_appointment(**overrides):
+    fields = {
+        'appointment_id': 'test-appt-123',
+        'patient_id': 'test-patient-123',
+        'practice_id': 'test-practice-123',
+        'practitioner_id': 'gp001',
+        'appointment_datetime': '2024-12-01T10:00:00',
+        'appointment_type': AppointmentType.FOLLOW_UP,
+        'duration_minutes': 15,
+        'reason': 'Blood test results',
+        'notes': 'Bring previous results',
+        'status': AppointmentStatus.SCHEDULED,
+        'created_by': 'test-patient-123',
+        'created_at': '2024-11-01T09:00:00',
+        'updated_at': '2024-11-01T09:00:00'
+    }
+    fields.update(overrides)
+    return Appointment.model_construct(**fields)
+
+
+def _fhir_appointment(**overrides):
+    fields = {
+        'id': 'fhir-appt-456',
+        'status': 'booked',
+        'appointmentType': {'code': 'consultation'},
+        'reasonCode': [{'text': 'Persistent cough'}],
+        'description': 'Booked via NHS App',
+        'start': '2024-12-02T14:30:00',
+        'end': '2024-12-02T14:40:00',
+        'minutesDuration': 10,
+        'participant': [
+            {'actor': {'reference': 'Patient/test-patient-123'}, 'status': 'accepted'},
+            {'actor': {'reference': 'Location/test-practice-123'}, 'status': 'accepted'},
+            {'actor': {'reference': 'Practitioner/gp002'}, 'status': 'accepted'}
+        ],
+        'created': '2024-11-20T08:00:00'
+    }
+    fields.update(overrides)
+    return FHIRAppointment(**fields)
+
+
+class TestFHIRAppointment:
+    """Test mapping between FHIR and internal appointments."""
+    
+    def test_from_internal_appointment(self):
+        """Test internal to FHIR mapping."""
+        
+        fhir = FHIRAppointment.from_internal_appointment(_internal_appointment())
+        
+        assert fhir.id == 'test-appt-123'
+        assert fhir.status == 'booked'
+        assert fhir.appointmentType == {'code': 'follow_up'}
+        assert fhir.reasonCode == [{'text': 'Blood test results'}]
+        assert fhir.description == 'Bring previous results'
+        assert fhir.start == '2024-12-01T10:00:00'
+        assert fhir.end == '2024-12-01T10:15:00'
+        assert fhir.minutesDuration == 15
+        assert [p['actor']['reference'] for p in fhir.participant] == [
+            'Patient/test-patient-123', 'Location/test-practice-123', 'Practitioner/gp001'
+        ]
+        assert fhir.created == '2024-11-01T09:00:00'
+    
+    def test_to_internal_appointment(self):
+        """Test FHIR to internal mapping."""
+        
+        appointment = _fhir_appointment().to_internal_appointment()
+        
+        assert appointment.appointment_id == 'fhir-appt-456'
+        assert appointment.patient_id == 'test-patient-123'
+        assert appointment.practice_id == 'test-practice-123'
+        assert appointment.practitioner_id == 'gp002'
+        assert appointment.appointment_datetime == '2024-12-02T14:30:00'
+        assert appointment.appointment_type is AppointmentType.CONSULTATION
+        assert appointment.duration_minutes == 10
+        assert appointment.reason == 'Persistent cough'
+        assert appointment.notes == 'Booked via NHS App'
+        assert appointment.status is AppointmentStatus.SCHEDULED
+        assert appointment.created_by == 'fhir'
+        assert appointment.created_at == '2024-11-20T08:00:00'
+    
+    @pytest.mark.parametrize('status', list(AppointmentStatus))
+    def test_round_trip(self, status):
+        """Test that internal appointments survive a FHIR round trip."""
+        
+        original = _internal_appointment(status=status)
+        
+        appointment = FHIRAppointment.from_internal_appointment(original).to_internal_appointment()
+        
+        for field in ('appointment_id', 'patient_id', 'practice_id', 'practitioner_id',
+                      'appointment_datetime', 'appointment_type', 'duration_minutes',
+                      'reason', 'notes', 'status', 'created_at'):
+            assert getattr(appointment, field) == getattr(original, field)
+    
+    @pytest.mark.parametrize('appointment_type,expected', [
+        ({'code': 'FOLLOWUP'}, AppointmentType.FOLLOW_UP),
+        ({'code': 'WALKIN'}, AppointmentType.URGENT),
+        ({'code': 'EMERGENCY'}, AppointmentType.URGENT),
+        ({'code': 'CHECKUP'}, AppointmentType.ROUTINE),
+        ({'code': 'not-a-real-code'}, AppointmentType.ROUTINE),
+        ({'display': 'No code given'}, AppointmentType.ROUTINE),
+        (None, AppointmentType.ROUTINE),
+    ])
+    def test_appointment_type_codings(self, appointment_type, expected):
+        """Test that HL7 codes map across and unknown or missing codes book as routine."""
+        
+        appointment = _fhir_appointment(appointmentType=appointment_type).to_internal_appointment()
+        
+        assert appointment.appointment_type is expected
+    
+    def test_unknown_status_books_as_scheduled(self):
+        """Test that an unrecognised FHIR status maps to scheduled."""
+        
+        appointment = _fhir_appointment(status='waitlist').to_internal_appointment()
+        
+        assert appointment.status is AppointmentStatus.SCHEDULED
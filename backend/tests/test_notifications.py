@@ -0,0 +1,190 @@
+"""
+Tests for notification sending.
+"""
+
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from botocore.exceptions import ClientError
+
+from utils import notifications as notifications_utils
+from utils.notifications import NotificationManager
+
+
+def _recipient(i, **overrides):
+    details = {
+        'appointment_id': f'appt-{i:04d}-abcdef',
+        'appointment_datetime': '2024-12-01T10:00:00',
+        'appointment_type': 'routine'
+    }
+    details.update(overrides)
+    return (f'patient{i}@example.com', f'Patient {i}', details)
+
+
+def _client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'Operation')
+
+
+def _accept_all(**kwargs):
+    return {'Status': [{'Status': 'Success'} for _ in kwargs['Destinations']]}
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """A NotificationManager with stubbed SES and SNS clients."""
+    monkeypatch.setattr(notifications_utils, '_REGISTERED_TEMPLATES', set())
+    manager = NotificationManager()
+    manager.ses_client = MagicMock()
+    manager.ses_client.send_bulk_templated_email.side_effect = _accept_all
+    manager.sns_client = MagicMock()
+    manager.sns_client.publish.return_value = {'MessageId': 'msg-1'}
+    return manager
+
+
+class TestClients:
+    """Test the shared SES and SNS clients."""
+    
+    def test_clients_are_shared(self):
+        assert NotificationManager().ses_client is NotificationManager().ses_client
+        assert notifications_utils._get_client('sns') is notifications_utils._get_client('sns')
+    
+    def test_pool_matches_send_workers(self):
+        client = notifications_utils._get_client('ses')
+        
+        assert client.meta.config.max_pool_connections == notifications_utils._SEND_WORKERS
+        assert client.meta.config.tcp_keepalive is True
+
+
+class TestTemplates:
+    """Test message bodies rendered from the module-level templates."""
+    
+    def test_confirmation_body(self, manager):
+        _, _, details = _recipient(1, reason='Blood test', duration_minutes=15)
+        
+        assert manager.send_appointment_confirmation('patient1@example.com', 'Patient 1', details)
+        
+        body = manager.ses_client.send_email.call_args.kwargs['Message']['Body']
+        assert 'Dear Patient 1,' in body['Html']['Data']
+        assert 'Sunday, 01 December 2024 at 10:00 AM' in body['Html']['Data']
+        assert '<p><strong>Reason:</strong> Blood test</p>' in body['Html']['Data']
+        assert 'Duration: 15 minutes' in body['Text']['Data']
+    
+    def test_sms_reminder_body(self, manager):
+        assert manager.send_sms_reminder('+447700900001', *_recipient(1)[1:])
+        
+        message = manager.sns_client.publish.call_args.kwargs['Message']
+        assert 'Hello Patient 1, you have an appointment tomorrow 01/12/2024 at 10:00.' in message
+        assert message.endswith('Appointment ID: appt-000')
+
+
+class TestReminderBatch:
+    """Test bulk reminder emails through SES templated sends."""
+    
+    def test_sends_in_chunks(self, manager):
+        recipients = [_recipient(i) for i in range(120)]
+        
+        assert manager.send_reminder_batch(recipients) == 120
+        
+        calls = manager.ses_client.send_bulk_templated_email.call_args_list
+        assert sorted(len(call.kwargs['Destinations']) for call in calls) == [20, 50, 50]
+        assert all(call.kwargs['Template'] == manager.reminder_template for call in calls)
+        sent_to = sorted(
+            destination['Destination']['ToAddresses'][0]
+            for call in calls for destination in call.kwargs['Destinations']
+        )
+        assert sent_to == sorted(email for email, _, _ in recipients)
+    
+    def test_template_data_fills_reminder_slots(self, manager):
+        manager.send_reminder_batch([_recipient(1)])
+        
+        destination = manager.ses_client.send_bulk_templated_email.call_args.kwargs['Destinations'][0]
+        assert json.loads(destination['ReplacementTemplateData']) == {
+            'patient_name': 'Patient 1',
+            'formatted_datetime': 'Sunday, 01 December 2024 at 10:00 AM',
+            'appointment_type': 'Routine',
+            'appointment_id': 'appt-0001-abcdef'
+        }
+    
+    def test_counts_only_accepted_destinations(self, manager):
+        manager.ses_client.send_bulk_templated_email.side_effect = None
+        manager.ses_client.send_bulk_templated_email.return_value = {
+            'Status': [{'Status': 'Success'}, {'Status': 'MessageRejected'}]
+        }
+        
+        assert manager.send_reminder_batch([_recipient(1), _recipient(2)]) == 1
+    
+    def test_template_registered_once(self, manager):
+        manager.send_reminder_batch([_recipient(1)])
+        manager.send_reminder_batch([_recipient(2)])
+        
+        manager.ses_client.create_template.assert_called_once()
+        template = manager.ses_client.create_template.call_args.kwargs['Template']
+        assert template['TemplateName'] == manager.reminder_template
+        for slot in notifications_utils._REMINDER_SLOTS:
+            assert '{{%s}}' % slot in template['HtmlPart']
+    
+    def test_existing_template_is_updated(self, manager):
+        manager.ses_client.create_template.side_effect = _client_error('AlreadyExists')
+        
+        assert manager.send_reminder_batch([_recipient(1)]) == 1
+        
+        manager.ses_client.update_template.assert_called_once_with(
+            Template=manager.ses_client.create_template.call_args.kwargs['Template']
+        )
+    
+    def test_template_failure_sends_nothing(self, manager):
+        manager.ses_client.create_template.side_effect = _client_error('AccessDenied')
+        
+        assert manager.send_reminder_batch([_recipient(1)]) == 0
+        
+        manager.ses_client.send_bulk_templated_email.assert_not_called()
+        assert manager.reminder_template not in notifications_utils._REGISTERED_TEMPLATES
+    
+    def test_failed_chunk_keeps_other_counts(self, manager):
+        recipients = [_recipient(i) for i in range(120)]
+        
+        def send(**kwargs):
+            # Fail the middle chunk, whichever worker picks it up
+            if kwargs['Destinations'][0]['Destination']['ToAddresses'] == ['patient50@example.com']:
+                raise _client_error('Throttling')
+            return _accept_all(**kwargs)
+        
+        manager.ses_client.send_bulk_templated_email.side_effect = send
+        
+        assert manager.send_reminder_batch(recipients) == 70
+        assert manager.ses_client.send_bulk_templated_email.call_count == 3
+    
+    def test_bad_recipient_fails_only_its_chunk(self, manager):
+        recipients = [_recipient(i) for i in range(60)]
+        recipients[55] = _recipient(55, appointment_datetime='not-a-date')
+        
+        assert manager.send_reminder_batch(recipients) == 50
+
+
+class TestSmsReminderBatch:
+    """Test SMS reminders fanned out over the send pool."""
+    
+    def test_publishes_per_number(self, manager):
+        recipients = [(f'+4477009000{i:02d}',) + _recipient(i)[1:] for i in range(40)]
+        
+        assert manager.send_sms_reminder_batch(recipients) == 40
+        
+        numbers = sorted(call.kwargs['PhoneNumber'] for call in manager.sns_client.publish.call_args_list)
+        assert numbers == sorted(number for number, _, _ in recipients)
+    
+    def test_failures_are_counted_per_recipient(self, manager):
+        def publish(PhoneNumber, Message):
+            if PhoneNumber == '+447700900001':
+                raise _client_error('InvalidParameter')
+            return {'MessageId': 'msg-1'}
+        
+        manager.sns_client.publish.side_effect = publish
+        recipients = [
+            ('+447700900000',) + _recipient(0)[1:],
+            ('+447700900001',) + _recipient(1)[1:],
+            ('+447700900002', 'Patient 2', {'appointment_id': 'appt-0002'}),
+            ('+447700900003',) + _recipient(3)[1:],
+        ]
+        
+        assert manager.send_sms_reminder_batch(recipients) == 2
@@ -2,40 +2,43 @@
 Tests for patient functions.
 """
 
+import base64
 import pytest
 import json
 from unittest.mock import patch
-import sys
-import os
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from patients import create_patient, get_patient, update_patient
+from utils.database import uniqueness_sentinel
 
 
 class TestGetPatient:
     """Test patient retrieval."""
     
+    @patch('utils.auth.auth.get_user_from_token')
     @patch('patients.get_patient.db')
-    def test_get_patient_success(self, mock_db, lambda_event, sample_patient):
+    def test_get_patient_success(self, mock_db, mock_get_user, lambda_event, sample_patient):
         """Test successful patient retrieval."""
-        from patients.get_patient import lambda_handler
         
+        mock_get_user.return_value = {'user_id': 'test-patient-123', 'role': 'patient'}
+        # The session-wide sample is a read-only mapping rather than a dict
         mock_db.get_item.return_value = sample_patient
         
         event = lambda_event(
             method='GET',
-            path='/patients/test-patient-123'
+            path='/patients/test-patient-123',
+            headers={'Authorization': 'Bearer test-token'}
         )
         event['pathParameters'] = {'patient_id': 'test-patient-123'}
         
-        response = lambda_handler(event, None)
+        response = get_patient.lambda_handler(event, None)
         
         assert response['statusCode'] == 200
         body = json.loads(response['body'])
-        assert body['patient_id'] == 'test-patient-123'
+        assert body['data']['patient_id'] == 'test-patient-123'
     
     @patch('patients.get_patient.db')
     def test_get_nonexistent_patient(self, mock_db, lambda_event):
         """Test getting non-existent patient."""
-        from patients.get_patient import lambda_handler
         
         mock_db.get_item.return_value = None
         
@@ -45,18 +48,42 @@ class TestGetPatient:
         )
         event['pathParameters'] = {'patient_id': 'nonexistent'}
         
-        response = lambda_handler(event, None)
+        response = get_patient.lambda_handler(event, None)
         
         assert response['statusCode'] == 404
 
 
+    @patch('patients.get_patient.db')
+    def test_recent_appointments_default_missing_fields(self, mock_db):
+        """Test that recent appointment summaries always carry every field."""
+        
+        mock_db.query_items.return_value = [
+            {'appointment_id': 'appt-1', 'appointment_datetime': '2024-06-01T10:00:00Z'},
+            {'appointment_id': 'appt-2', 'appointment_datetime': '2024-06-02T10:00:00Z',
+             'status': 'scheduled', 'reason': 'Checkup', 'notes': 'not returned'}
+        ]
+        
+        appointments = get_patient.get_recent_appointments('test-patient-123')
+        
+        assert [a['appointment_id'] for a in appointments] == ['appt-2', 'appt-1']
+        assert appointments[1] == {
+            'appointment_id': 'appt-1',
+            'appointment_datetime': '2024-06-01T10:00:00Z',
+            'appointment_type': '',
+            'status': '',
+            'reason': '',
+            'practice_id': '',
+            'practitioner_id': ''
+        }
+        assert 'notes' not in appointments[0]
+
+
 class TestUpdatePatient:
     """Test patient updates."""
     
     @patch('patients.update_patient.db')
     def test_update_patient_success(self, mock_db, lambda_event, sample_patient):
         """Test successful patient update."""
-        from patients.update_patient import lambda_handler
         
         mock_db.get_item.return_value = sample_patient
         mock_db.update_item.return_value = {**sample_patient, 'phone': '07999888777'}
@@ -70,13 +97,12 @@ class TestUpdatePatient:
         )
         event['pathParameters'] = {'patient_id': 'test-patient-123'}
         
-        response = lambda_handler(event, None)
+        response = update_patient.lambda_handler(event, None)
         
         assert response['statusCode'] == 200
     
     def test_update_patient_invalid_phone(self, lambda_event):
         """Test patient update with invalid phone."""
-        from patients.update_patient import lambda_handler
         
         event = lambda_event(
             method='PUT',
@@ -87,6 +113,213 @@ class TestUpdatePatient:
         )
         event['pathParameters'] = {'patient_id': 'test-patient-123'}
         
-        response = lambda_handler(event, None)
+        response = update_patient.lambda_handler(event, None)
         
         assert response['statusCode'] == 400
+    
+    @patch('utils.auth.auth.get_user_from_token')
+    @patch('patients.update_patient.db')
+    def test_update_patient_validates_changed_fields(self, mock_db, mock_get_user, lambda_event):
+        """Test that phone and postcode changes are validated before the write."""
+        
+        mock_get_user.return_value = {'user_id': 'test-patient-123', 'role': 'patient'}
+        
+        for body in ({'phone': 'invalid'}, {'address': {'postcode': 'INVALID'}}):
+            event = lambda_event(
+                method='PUT',
+                path='/patients/test-patient-123',
+                body=json.dumps(body),
+                headers={'Authorization': 'Bearer test-token'}
+            )
+            event['pathParameters'] = {'patient_id': 'test-patient-123'}
+            
+            response = update_patient.lambda_handler(event, None)
+            
+            assert response['statusCode'] == 400
+        mock_db.update_item_dict.assert_not_called()
+    
+    @patch('utils.auth.auth.get_user_from_token')
+    @patch('patients.update_patient.db')
+    def test_update_patient_rejects_non_string_legacy_items(self, mock_db, mock_get_user, lambda_event):
+        """Test that *_legacy lists are validated before they're lifted into coded items."""
+        
+        mock_get_user.return_value = {'user_id': 'staff-123', 'role': 'staff', 'practice_id': 'practice-001'}
+        
+        event = lambda_event(
+            method='PUT',
+            path='/patients/test-patient-123',
+            body=json.dumps({'medical_info': {'allergies_legacy': [{'severity': 'unknown'}]}}),
+            headers={'Authorization': 'Bearer test-token'}
+        )
+        event['pathParameters'] = {'patient_id': 'test-patient-123'}
+        
+        response = update_patient.lambda_handler(event, None)
+        
+        assert response['statusCode'] == 400
+        assert 'allergies_legacy' in json.loads(response['body'])['errors']['medical_info']
+        mock_db.update_item_dict.assert_not_called()
+    
+    @patch('utils.auth.auth.get_user_from_token')
+    @patch('patients.update_patient.db')
+    def test_update_patient_non_object_body(self, mock_db, mock_get_user, lambda_event):
+        """Test that valid JSON which isn't an object is rejected with a 400."""
+        
+        mock_get_user.return_value = {'user_id': 'test-patient-123', 'role': 'patient'}
+        
+        for body in ('[]', '"x"', '1'):
+            event = lambda_event(
+                method='PUT',
+                path='/patients/test-patient-123',
+                body=body,
+                headers={'Authorization': 'Bearer test-token'}
+            )
+            event['pathParameters'] = {'patient_id': 'test-patient-123'}
+        
+            response = update_patient.lambda_handler(event, None)
+        
+            assert response['statusCode'] == 400
+            assert json.loads(response['body'])['error'] == 'Request body must be a JSON object'
+        mock_db.update_item_dict.assert_not_called()
+    
+    @patch('utils.auth.auth.get_user_from_token')
+    @patch('patients.update_patient.db')
+    def test_update_patient_base64_body(self, mock_db, mock_get_user, lambda_event, sample_patient):
+        """Test that a base64-encoded body is decoded before parsing."""
+        
+        mock_get_user.return_value = {'user_id': 'test-patient-123', 'role': 'patient'}
+        mock_db.update_item_dict.return_value = {**sample_patient, 'phone': '07999888777'}
+        
+        event = lambda_event(
+            method='PUT',
+            path='/patients/test-patient-123',
+            body=base64.b64encode(json.dumps({'phone': '07999888777'}).encode()).decode(),
+            headers={'Authorization': 'Bearer test-token'}
+        )
+        event['pathParameters'] = {'patient_id': 'test-patient-123'}
+        event['isBase64Encoded'] = True
+        
+        response = update_patient.lambda_handler(event, None)
+        
+        assert response['statusCode'] == 200
+        assert mock_db.update_item_dict.call_args[0][2]['phone'] == '07999888777'
+    
+    @patch('utils.auth.auth.get_user_from_token')
+    def test_update_patient_email_moves_sentinel(self, mock_get_user, moto_db, lambda_event):
+        """Test that an email change reserves the new address and releases the old one."""
+        
+        mock_get_user.return_value = {'user_id': 'patient-1', 'role': 'patient'}
+        for patient_id, email in (('patient-1', 'old@example.com'), ('patient-2', 'taken@example.com')):
+            moto_db.transact_write_items([
+                {'table': 'patients', 'item': {
+                    'patient_id': patient_id, 'first_name': 'Test', 'last_name': 'User', 'email': email
+                }},
+                uniqueness_sentinel(f'EMAIL#{email}', patient_id, '2024-01-01T00:00:00')
+            ])
+        # Reserved by a registration that hasn't written its record yet
+        moto_db.transact_write_items([
+            uniqueness_sentinel('EMAIL#racer@example.com', 'patient-3', '2024-01-01T00:00:00')
+        ])
+        
+        def update_email(email):
+            event = lambda_event(
+                method='PUT',
+                path='/patients/patient-1',
+                body=json.dumps({'email': email}),
+                headers={'Authorization': 'Bearer test-token'}
+            )
+            event['pathParameters'] = {'patient_id': 'patient-1'}
+            return update_patient.lambda_handler(event, None)
+        
+        with patch('patients.update_patient.db', moto_db):
+            response = update_email('New@Example.com')
+            assert response['statusCode'] == 200
+            assert json.loads(response['body'])['data']['email'] == 'new@example.com'
+            
+            assert update_email('taken@example.com')['statusCode'] == 409
+            assert update_email('racer@example.com')['statusCode'] == 409
+        
+        assert moto_db.get_item('patients', {'patient_id': 'patient-1'})['email'] == 'new@example.com'
+        assert moto_db.get_item('patients', {'patient_id': 'UNIQ#EMAIL#new@example.com'})['owner_patient_id'] == 'patient-1'
+        assert moto_db.get_item('patients', {'patient_id': 'UNIQ#EMAIL#old@example.com'}) is None
+        assert moto_db.get_item('patients', {'patient_id': 'UNIQ#EMAIL#racer@example.com'})['owner_patient_id'] == 'patient-3'
+    
+    def test_scan_patients_skips_sentinels(self, moto_db):
+        """Test that patients scans return patient records only."""
+        
+        moto_db.transact_write_items([
+            {'table': 'patients', 'item': {'patient_id': 'patient-1', 'email': 'a@example.com', 'status': 'active'}},
+            uniqueness_sentinel('EMAIL#a@example.com', 'patient-1', '2024-01-01T00:00:00')
+        ])
+        
+        assert [p['patient_id'] for p in moto_db.scan_items('patients')] == ['patient-1']
+        # The sentinel filter still applies alongside the caller's own
+        assert moto_db.scan_items(
+            'patients', filter_expression='begins_with(patient_id, :prefix)', expression_values={':prefix': 'UNIQ#'}
+        ) == []
+
+class TestCreatePatient:
+    """Test cases for create patient function."""
+    
+    @patch('utils.auth.auth.get_user_from_token')
+    def test_create_patient_concurrent_lookups(self, mock_get_user, moto_db, lambda_event):
+        """Test the create path end to end, with the pre-write lookups on worker threads."""
+        
+        mock_get_user.return_value = {
+            'user_id': 'staff-123', 'role': 'staff', 'practice_id': 'practice-001'
+        }
+        moto_db.create_item('practices', {'practice_id': 'practice-001', 'name': 'Riverside Medical Centre'})
+        body = json.dumps({
+            'first_name': 'John',
+            'last_name': 'Smith',
+            'date_of_birth': '1990-01-15',
+            'email': 'John.Smith@example.com',
+            'phone': '07123456789',
+            'nhs_number': '9434765919',
+            'practice_id': 'practice-001'
+        })
+        
+        with patch('patients.create_patient.db', moto_db):
+            responses = [
+                create_patient.lambda_handler(
+                    lambda_event(method='POST', path='/patients', body=body,
+                                 headers={'Authorization': 'Bearer test-token'}),
+                    None
+                )
+                for _ in range(2)
+            ]
+        
+        assert responses[0]['statusCode'] == 201
+        assert responses[1]['statusCode'] == 409
+        
+        patient_id = json.loads(responses[0]['body'])['data']['patient_id']
+        assert moto_db.get_item('patients', {'patient_id': patient_id})['email'] == 'john.smith@example.com'
+        assert moto_db.get_item('patients', {'patient_id': 'UNIQ#NHS#9434765919'})['owner_patient_id'] == patient_id
+        assert moto_db.get_item('patients', {'patient_id': 'UNIQ#EMAIL#john.smith@example.com'})['owner_patient_id'] == patient_id
+    
+    @patch('utils.auth.auth.get_user_from_token')
+    def test_create_patient_unknown_practice(self, mock_get_user, moto_db, lambda_event):
+        """Test that a patient can't be registered with a practice that doesn't exist."""
+        
+        mock_get_user.return_value = {
+            'user_id': 'staff-123', 'role': 'staff', 'practice_id': 'practice-001'
+        }
+        event = lambda_event(
+            method='POST',
+            path='/patients',
+            body=json.dumps({
+                'first_name': 'John',
+                'last_name': 'Smith',
+                'date_of_birth': '1990-01-15',
+                'email': 'john.smith@example.com',
+                'practice_id': 'no-such-practice'
+            }),
+            headers={'Authorization': 'Bearer test-token'}
+        )
+        
+        with patch('patients.create_patient.db', moto_db):
+            response = create_patient.lambda_handler(event, None)
+        
+        assert response['statusCode'] == 400
+        assert json.loads(response['body'])['error'] == 'Practice not found'
+        assert moto_db.scan_items('patients') == []
+
@@ -0,0 +1,41 @@
+"""
+Tests for request parsing helpers.
+"""
+
+import base64
+import json
+
+import pytest
+
+from utils.request import RequestBodyError, parse_json_body
+
+
+class TestParseJsonBody:
+    """Test request body parsing."""
+    
+    @pytest.mark.parametrize('body', [
+        '{"name": "John"}',
+        b'{"name": "John"}',
+        {'name': 'John'},
+    ])
+    def test_parses_object(self, body):
+        assert parse_json_body({'body': body}) == {'name': 'John'}
+    
+    def test_decodes_base64(self):
+        body = base64.b64encode(json.dumps({'name': 'John'}).encode()).decode()
+        
+        assert parse_json_body({'body': body, 'isBase64Encoded': True}) == {'name': 'John'}
+    
+    @pytest.mark.parametrize('event,message', [
+        ({}, "Request body is required"),
+        ({'body': None}, "Request body is required"),
+        ({'body': '{not json'}, "Invalid JSON in request body"),
+        ({'body': 'not base64!', 'isBase64Encoded': True}, "Invalid base64 in request body"),
+        ({'body': '[]'}, "Request body must be a JSON object"),
+        ({'body': '"x"'}, "Request body must be a JSON object"),
+        ({'body': '1'}, "Request body must be a JSON object"),
+        ({'body': ['pre', 'parsed']}, "Request body must be a JSON object"),
+    ])
+    def test_rejects_bad_body(self, event, message):
+        with pytest.raises(RequestBodyError, match=message):
+            parse_json_body(event)
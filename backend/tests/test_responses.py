@@ -0,0 +1,23 @@
+"""
+Tests for HTTP response helpers.
+"""
+
+import json
+from datetime import datetime, timezone
+
+from utils.responses import success_response, bad_request_response
+
+
+class TestResponseTimestamp:
+    """Test the timestamp included in response bodies."""
+    
+    def test_timestamp_is_naive_utc_isoformat(self):
+        for response in (success_response({'ok': True}), bad_request_response("Bad")):
+            timestamp = json.loads(response['body'])['timestamp']
+            parsed = datetime.fromisoformat(timestamp)
+            
+            # Same shape as datetime.utcnow().isoformat(): no offset, full precision
+            assert parsed.tzinfo is None
+            assert parsed.isoformat() == timestamp
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            assert abs((now - parsed).total_seconds()) < 5
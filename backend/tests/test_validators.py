@@ -3,99 +3,170 @@ Tests for validation functions.
 """
 
 import pytest
-import sys
-import os
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'utils'))
 
-from validators import (
+from utils.validators import (
     validate_email,
     validate_nhs_number,
+    validate_nhs_numbers,
     validate_phone_number,
     validate_postcode,
-    validate_date_string
+    validate_date_string,
+    validate_medical_info
 )
 
 
 class TestEmailValidation:
     """Test email validation."""
     
-    def test_valid_emails(self):
-        assert validate_email('test@example.com') == True
-        assert validate_email('user.name@domain.co.uk') == True
-        assert validate_email('test+tag@gmail.com') == True
+    @pytest.mark.parametrize('email', [
+        'test@example.com',
+        'user.name@domain.co.uk',
+        'test+tag@gmail.com',
+    ])
+    def test_valid_emails(self, email):
+        assert validate_email(email) == True
     
-    def test_invalid_emails(self):
-        assert validate_email('invalid') == False
-        assert validate_email('test@') == False
-        assert validate_email('@example.com') == False
-        assert validate_email('') == False
+    @pytest.mark.parametrize('email', [
+        'invalid',
+        'test@',
+        '@example.com',
+        '',
+        'test@example.com\n',
+    ])
+    def test_invalid_emails(self, email):
+        assert validate_email(email) == False
 
 
 class TestNHSNumberValidation:
     """Test NHS number validation with Modulus 11 algorithm."""
     
-    def test_valid_nhs_numbers(self):
-        assert validate_nhs_number('9434765919') == True
-        assert validate_nhs_number('943 476 5919') == True
-        assert validate_nhs_number('401 023 2137') == True
-        assert validate_nhs_number('4010232137') == True
+    @pytest.mark.parametrize('nhs_number', [
+        '9434765919',
+        '943 476 5919',
+        '401 023 2137',
+        '4010232137',
+    ])
+    def test_valid_nhs_numbers(self, nhs_number):
+        assert validate_nhs_number(nhs_number) == True
     
-    def test_invalid_nhs_numbers(self):
-        assert validate_nhs_number('1234567890') == False
-        assert validate_nhs_number('123456789') == False  # Too short
-        assert validate_nhs_number('12345678901') == False  # Too long
-        assert validate_nhs_number('') == False
-        assert validate_nhs_number('abcdefghij') == False
+    @pytest.mark.parametrize('nhs_number', [
+        '1234567890',
+        '123456789',  # Too short
+        '12345678901',  # Too long
+        '',
+        'abcdefghij',
+    ])
+    def test_invalid_nhs_numbers(self, nhs_number):
+        assert validate_nhs_number(nhs_number) == False
     
     def test_nhs_number_with_invalid_check_digit(self):
         assert validate_nhs_number('9434765918') == False  # Wrong check digit
+    
+    @pytest.mark.parametrize('nhs_number, expected', [
+        ('943-476-5919', True),
+        ('943 476 5919 ', True),
+        ('943.476.5919', False),  # Only spaces and hyphens
+        ('943 476 591x', False),
+    ])
+    def test_nhs_number_separators(self, nhs_number, expected):
+        assert validate_nhs_number(nhs_number) == expected
+    
+    def test_batch(self):
+        numbers = ['9434765919', '943 476 5919', '9434765918', '123456789', '', None, 4010232137]
+        assert validate_nhs_numbers(numbers) == [True, True, False, False, False, False, False]
+        assert validate_nhs_numbers(numbers) == [validate_nhs_number(n) for n in numbers]
 
 
 class TestPhoneNumberValidation:
     """Test UK phone number validation."""
     
-    def test_valid_phone_numbers(self):
-        assert validate_phone_number('07123456789') == True
-        assert validate_phone_number('07123 456789') == True
-        assert validate_phone_number('+447123456789') == True
-        assert validate_phone_number('020 7123 4567') == True
-        assert validate_phone_number('01234567890') == True
-    
-    def test_invalid_phone_numbers(self):
-        assert validate_phone_number('123') == False
-        assert validate_phone_number('') == False
-        assert validate_phone_number('abcdefghijk') == False
-        assert validate_phone_number('9999999999') == False  # Invalid prefix
+    @pytest.mark.parametrize('phone', [
+        '07123456789',
+        '07123 456789',
+        '+447123456789',
+        '020 7123 4567',
+        '01234567890',
+    ])
+    def test_valid_phone_numbers(self, phone):
+        assert validate_phone_number(phone) == True
+    
+    @pytest.mark.parametrize('phone', [
+        '123',
+        '',
+        'abcdefghijk',
+        '9999999999',  # Invalid prefix
+    ])
+    def test_invalid_phone_numbers(self, phone):
+        assert validate_phone_number(phone) == False
 
 
 class TestPostcodeValidation:
     """Test UK postcode validation."""
     
-    def test_valid_postcodes(self):
-        assert validate_postcode('SW1A 1AA') == True
-        assert validate_postcode('M1 1AE') == True
-        assert validate_postcode('B33 8TH') == True
-        assert validate_postcode('CR2 6XH') == True
-        assert validate_postcode('DN55 1PT') == True
-    
-    def test_invalid_postcodes(self):
-        assert validate_postcode('INVALID') == False
-        assert validate_postcode('') == False
-        assert validate_postcode('12345') == False
+    @pytest.mark.parametrize('postcode', [
+        'SW1A 1AA',
+        'M1 1AE',
+        'B33 8TH',
+        'CR2 6XH',
+        'DN55 1PT',
+    ])
+    def test_valid_postcodes(self, postcode):
+        assert validate_postcode(postcode) == True
+    
+    @pytest.mark.parametrize('postcode', [
+        'INVALID',
+        '',
+        '12345',
+    ])
+    def test_invalid_postcodes(self, postcode):
+        assert validate_postcode(postcode) == False
 
 
 class TestDateValidation:
     """Test date string validation."""
     
-    def test_valid_dates(self):
-        assert validate_date_string('2024-01-01') == True
-        assert validate_date_string('1990-12-31') == True
-        assert validate_date_string('2000-06-15') == True
-    
-    def test_invalid_dates(self):
-        assert validate_date_string('2024-13-01') == False  # Invalid month
-        assert validate_date_string('2024-01-32') == False  # Invalid day
-        assert validate_date_string('01-01-2024') == False  # Wrong format
-        assert validate_date_string('2024/01/01') == False  # Wrong separator
-        assert validate_date_string('') == False
-        assert validate_date_string('not-a-date') == False
+    @pytest.mark.parametrize('date_string', [
+        '2024-01-01',
+        '1990-12-31',
+        '2000-06-15',
+    ])
+    def test_valid_dates(self, date_string):
+        assert validate_date_string(date_string) == True
+    
+    @pytest.mark.parametrize('date_string', [
+        '2024-13-01',  # Invalid month
+        '2024-01-32',  # Invalid day
+        '01-01-2024',  # Wrong format
+        '2024/01/01',  # Wrong separator
+        '',
+        'not-a-date',
+        '2024-1-01',  # Unpadded month
+    ])
+    def test_invalid_dates(self, date_string):
+        assert validate_date_string(date_string) == False
+
+
+class TestMedicalInfoValidation:
+    """Test medical information validation."""
+    
+    def test_legacy_strings_are_valid(self):
+        result = validate_medical_info({'allergies_legacy': ['Penicillin'], 'medications_legacy': []})
+        
+        assert result.valid
+    
+    @pytest.mark.parametrize('legacy,error_key', [
+        ([{'display_text': 'Penicillin', 'severity': 'unknown'}], 'format'),
+        ([42], 'format'),
+        (['   '], 'display_text'),
+        (['x' * 201], 'display_text'),
+    ])
+    def test_invalid_legacy_items(self, legacy, error_key):
+        result = validate_medical_info({'allergies_legacy': legacy})
+        
+        assert not result.valid
+        assert error_key in result.errors['allergies_legacy'][0]['allergy_legacy_0']
+    
+    def test_legacy_must_be_a_list(self):
+        result = validate_medical_info({'conditions_legacy': 'Asthma'})
+        
+        assert result.errors == {'conditions_legacy': ['Condition legacy entries must be a list']}